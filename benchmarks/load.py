@@ -0,0 +1,281 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""End-to-end load test of the CyCAx Server.
+
+Starts the server with uvicorn on a temporary CYCAX_VAR_DIR, or uses a running server with --url, and drives it with
+simulated clients:
+
+- Submitters post part specs, every few parts an assembly of the last parts is posted as well.
+- FreeCAD and Blender workers claim tasks with a long-poll, set them to RUNNING, read the spec, upload an artifact,
+  complete the task and download the artifact again.
+
+The run ends when every submitted task is completed, or after --timeout seconds. The throughput and the latency
+percentiles of every endpoint are printed, and with --json written to a file that can be compared between runs. The
+tasks that were not completed are listed and make the run fail.
+
+    python benchmarks/load.py --submitters 4 --jobs 200 --freecad-workers 8 --artifact-size 1048576
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from cycax_server.internal.task_stats import PERCENTILES, percentile
+
+SRC_PATH = Path(__file__).parent.parent / "src"
+
+
+class Recorder:
+    """Collect the latency of every request by endpoint."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.started_at = time.perf_counter()
+        self.stopped_at: float | None = None
+
+    async def request(
+        self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs
+    ) -> httpx.Response:
+        """Send a request and record its latency under the endpoint name."""
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        # Read the whole body, a download is only done when the last byte arrived.
+        await response.aread()
+        if endpoint == "POST /tasks/claim" and response.is_success and response.json()["data"] is None:
+            # A claim without a task waited out the long-poll, keep it apart from the claims that got a task.
+            endpoint = "POST /tasks/claim (empty)"
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if response.is_error:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+    def report(self) -> dict:
+        """Summarize the requests by endpoint: count, errors, requests per second and latency percentiles in ms."""
+        elapsed = (self.stopped_at or time.perf_counter()) - self.started_at
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            summary = {
+                "count": len(ordered),
+                "errors": self.errors.get(endpoint, 0),
+                "per_second": len(ordered) / elapsed,
+            }
+            for percent in PERCENTILES:
+                summary[f"p{percent}_ms"] = percentile(ordered, percent) * 1000
+            summary["max_ms"] = ordered[-1] * 1000
+            endpoints[endpoint] = summary
+        return {"elapsed_seconds": elapsed, "endpoints": endpoints}
+
+
+class LoadTest:
+    """The simulated submitters and workers of one run."""
+
+    def __init__(self, args: argparse.Namespace, recorder: Recorder):
+        self.args = args
+        self.recorder = recorder
+        self.artifact = os.urandom(args.artifact_size)
+        # The Jobs whose task is not completed yet by ID, to the task name. The workers stop when there are none left.
+        self.pending: dict[str, str] = {}
+        # A task can be completed before the submitter has read the reply to its POST /jobs.
+        self.completed: set[str] = set()
+        self.submitters_done = asyncio.Event()
+
+    async def submitter(self, client: httpx.AsyncClient, number: int):
+        """Post the part specs, and an assembly of the last parts every assembly_every parts."""
+        parts = []
+        for index in range(self.args.jobs):
+            # Unique sizes give every spec its own Job.
+            spec = {
+                "name": f"load-part-{number}-{index}",
+                "features": [{"name": "cube", "x_size": index + 1, "y_size": number + 1, "z_size": self.args.seed}]
+                * self.args.features,
+            }
+            response = await self.recorder.request(client, "POST /jobs", "POST", "/jobs", json=spec)
+            response.raise_for_status()
+            self.add_pending(response.json()["data"], "freecad")
+            parts.append(spec)
+            if self.args.assembly_every and len(parts) == self.args.assembly_every:
+                assembly = {
+                    "name": f"load-assembly-{number}-{index}",
+                    "parts": [{**part, "position": [position * 10, 0, 0]} for position, part in enumerate(parts)],
+                }
+                response = await self.recorder.request(client, "POST /jobs", "POST", "/jobs", json=assembly)
+                response.raise_for_status()
+                self.add_pending(response.json()["data"], "blender")
+                parts = []
+
+    def add_pending(self, job: dict, task: str):
+        """Wait for the task of a submitted Job, unless the Job was completed in an earlier run."""
+        if job["attributes"]["state"]["job"] != "COMPLETED" and job["id"] not in self.completed:
+            self.pending[job["id"]] = task
+
+    async def worker(self, client: httpx.AsyncClient, task: str):
+        """Claim and complete tasks until all the submitted tasks are done."""
+        while not (self.submitters_done.is_set() and not self.pending):
+            response = await self.recorder.request(
+                client, "POST /tasks/claim", "POST", "/tasks/claim", params={"task": task, "wait": 1}
+            )
+            response.raise_for_status()
+            claimed = response.json()["data"]
+            if claimed is None:
+                continue
+            job_id = claimed["attributes"]["job_id"]
+            lease_token = claimed["attributes"]["lease_token"]
+            update = [{"job_id": job_id, "name": task, "state": "RUNNING", "lease_token": lease_token}]
+            response = await self.recorder.request(client, "POST /tasks:batch", "POST", "/tasks:batch", json=update)
+            response.raise_for_status()
+            if "errors" in response.json():
+                msg = f"Task {task} of job {job_id} was not set to RUNNING: {response.json()['errors']}"
+                raise RuntimeError(msg)
+            await self.recorder.request(client, "GET /jobs/{id}/spec", "GET", f"/jobs/{job_id}/spec")
+            filename = f"{task}.bin"
+            await self.recorder.request(
+                client,
+                "POST /jobs/{id}/artifacts",
+                "POST",
+                f"/jobs/{job_id}/artifacts",
+                data={"filename": filename},
+                files={"upload_file": (filename, self.artifact)},
+            )
+            response = await self.recorder.request(
+                client,
+                "POST /jobs/{id}/tasks",
+                "POST",
+                f"/jobs/{job_id}/tasks",
+                json={"name": task, "state": "COMPLETED", "lease_token": lease_token},
+            )
+            response.raise_for_status()
+            self.completed.add(job_id)
+            self.pending.pop(job_id, None)
+            await self.recorder.request(
+                client, "GET /jobs/{id}/artifacts/{name}", "GET", f"/jobs/{job_id}/artifacts/{filename}"
+            )
+
+    async def run(self, url: str):
+        """Run the submitters and workers until every task is completed or the timeout passed."""
+        limits = httpx.Limits(max_connections=None)
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+            workers = [
+                asyncio.create_task(self.worker(client, "freecad")) for _ in range(self.args.freecad_workers)
+            ] + [asyncio.create_task(self.worker(client, "blender")) for _ in range(self.args.blender_workers)]
+            try:
+                async with asyncio.timeout(self.args.timeout):
+                    await asyncio.gather(*(self.submitter(client, number) for number in range(self.args.submitters)))
+                    self.submitters_done.set()
+                    await asyncio.gather(*workers)
+            except TimeoutError:
+                print(f"Timed out after {self.args.timeout}s", file=sys.stderr)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                self.recorder.stopped_at = time.perf_counter()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(var_dir: Path, port: int, server_workers: int) -> subprocess.Popen:
+    """Start the server with uvicorn and wait until it answers."""
+    env = {
+        **os.environ,
+        "CYCAX_VAR_DIR": str(var_dir),
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(SRC_PATH), os.environ.get("PYTHONPATH")])),
+    }
+    if server_workers > 1:
+        env.update({"CYCAX_JOB_STORE": "sqlite", "CYCAX_SHARED_STORE": "true"})
+    command = [sys.executable, "-m", "uvicorn", "cycax_server.main:app", "--port", str(port), "--log-level", "warning"]
+    command += ["--workers", str(server_workers)]
+    process = subprocess.Popen(command, env=env)  # noqa: S603 - The command is built from fixed parts.
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/jobs", params={"limit": 1}).raise_for_status()
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                msg = "The server exited during startup"
+                raise RuntimeError(msg) from None
+            time.sleep(0.1)
+        else:
+            return process
+    process.terminate()
+    msg = "The server did not start in time"
+    raise RuntimeError(msg)
+
+
+def print_report(report: dict):
+    print(f"Elapsed: {report['elapsed_seconds']:.2f}s")
+    columns = ["count", "errors", "per_second", *(f"p{percent}_ms" for percent in PERCENTILES), "max_ms"]
+    print(f"{'endpoint':<34}" + "".join(f"{column:>12}" for column in columns))
+    for endpoint, summary in report["endpoints"].items():
+        values = "".join(
+            f"{summary[column]:>12}" if isinstance(summary[column], int) else f"{summary[column]:>12.2f}"
+            for column in columns
+        )
+        print(f"{endpoint:<34}{values}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Use a running server instead of starting one")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes, >1 shares a store")
+    parser.add_argument("--submitters", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=100, help="Part specs posted by each submitter")
+    parser.add_argument("--features", type=int, default=10, help="Features in every part spec")
+    parser.add_argument("--assembly-every", type=int, default=5, help="Post an assembly every N parts, 0 for none")
+    parser.add_argument("--freecad-workers", type=int, default=8)
+    parser.add_argument("--blender-workers", type=int, default=2)
+    parser.add_argument("--artifact-size", type=int, default=64 * 1024, help="Bytes in every uploaded artifact")
+    parser.add_argument("--seed", type=int, default=int(time.time()), help="Makes the specs differ from other runs")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before the run is stopped")
+    parser.add_argument("--json", type=Path, help="Write the report to this file")
+    args = parser.parse_args()
+    if args.assembly_every and not args.blender_workers:
+        parser.error("Assemblies need --blender-workers, or set --assembly-every 0")
+
+    recorder = Recorder()
+    load_test = LoadTest(args, recorder)
+    with tempfile.TemporaryDirectory(prefix="cycax_load_") as var_dir:
+        server = None
+        url = args.url
+        if url is None:
+            port = free_port()
+            server = start_server(Path(var_dir), port, args.server_workers)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            recorder.started_at = time.perf_counter()
+            asyncio.run(load_test.run(url))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    report = recorder.report()
+    report["arguments"] = {name: value for name, value in vars(args).items() if name != "json"}
+    report["incomplete_tasks"] = [{"job_id": job_id, "task": task} for job_id, task in load_test.pending.items()]
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, default=str))
+    if report["incomplete_tasks"]:
+        print(f"{len(report['incomplete_tasks'])} tasks were not completed:", file=sys.stderr)
+        for incomplete in report["incomplete_tasks"]:
+            print(f"  {incomplete['task']} of job {incomplete['job_id']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Scaling micro-benchmarks of the JobManager hot paths.
+
+For every registry size and spec size a synthetic var_dir is generated: 70% of the Jobs are COMPLETED with an
+artifact, 10% have a leased task and are RUNNING, and 20% are CREATED. On a fresh registry the time and the peak
+memory, traced with tracemalloc, are then recorded for:
+
+- update_from_disk: loading the registry from the store.
+- list_jobs: all the Jobs, and the RUNNING Jobs.
+- dump: dumping every Job the way the job list does.
+- job_from_spec: submitting --submit new specs to the loaded registry.
+- prune_old_jobs and prune_stuck_jobs: two passes of each background task, nothing is due.
+
+The results are printed and with --json written to a file, --compare prints the change from an earlier file.
+
+    python benchmarks/scale.py --scales 10000 100000 1000000 --features 10 100 --json scale.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from cycax_server.internal.background import prune_old_jobs, prune_stuck_jobs
+from cycax_server.internal.job_manager import JobManager, JobState, TaskState
+from cycax_server.internal.settings import Settings
+
+
+def make_spec(index: int, features: int) -> dict:
+    """A part spec, the index makes the spec and the Job unique."""
+    return {
+        "name": f"scale-part-{index % 1000}",
+        "features": [
+            {"name": "hole", "side": "TOP", "x": index, "y": number, "diameter": 3.0, "depth": 2.0}
+            for number in range(features)
+        ],
+    }
+
+
+def generate(settings: Settings, scale: int, features: int):
+    """Fill the var_dir with a registry of scale Jobs in a mix of states."""
+    manager = JobManager(settings)
+    manager.update_from_disk()
+    with manager.batch_writes():
+        jobs = [manager.job_from_spec(make_spec(index, features)) for index in range(scale)]
+    for index, job in enumerate(jobs):
+        kind = index % 10
+        if kind < 7:  # noqa: PLR2004 - 70% of the jobs are completed.
+            job.save_artifact("model.stl", io.BytesIO(job.job_id.encode()))
+            job.set_task_state("freecad", TaskState.COMPLETED)
+        elif kind == 7:  # noqa: PLR2004 - 10% of the jobs are running.
+            job.lease_task("freecad", 3600)
+    manager.close()
+
+
+def measure(results: list[dict], operation: str, func: Callable, *, count: int = 1, **labels):
+    """Run func once, add its time and traced peak memory to the results and return its result."""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    result = {**labels, "operation": operation, "count": count, "seconds": seconds, "per_op_seconds": seconds / count}
+    if tracemalloc.is_tracing():
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1] - start_size
+    results.append(result)
+    print_result(result)
+    return value
+
+
+def run_scale(var_dir: Path, args: argparse.Namespace, scale: int, features: int) -> list[dict]:
+    settings = Settings(var_dir=var_dir, job_store=args.store)
+    labels = {"scale": scale, "features": features}
+    results = []
+    start = time.perf_counter()
+    generate(settings, scale, features)
+    print(f"Generated {scale} jobs with {features} features in {time.perf_counter() - start:.1f}s")
+
+    if not args.no_tracemalloc:
+        # Only trace the measured operations, tracing slows the generation down.
+        tracemalloc.start()
+    manager = JobManager(settings)
+    measure(results, "update_from_disk", manager.update_from_disk, **labels)
+    jobs = measure(results, "list_jobs", manager.list_jobs, **labels)
+    measure(results, "list_jobs_running", lambda: manager.list_jobs(states_in=[JobState.RUNNING]), **labels)
+    measure(results, "dump", lambda: [job.dump(short=True) for job in jobs], count=len(jobs), **labels)
+    specs = [make_spec(scale + index, features) for index in range(args.submit)]
+    measure(
+        results,
+        "job_from_spec",
+        lambda: [manager.job_from_spec(spec) for spec in specs],
+        count=len(specs),
+        **labels,
+    )
+    for prune in (prune_old_jobs, prune_stuck_jobs):
+        # The first pass after a load also checks what was found on disk, the next pass is the steady state.
+        measure(results, prune.__name__, lambda prune=prune: asyncio.run(prune(manager, settings)), **labels)
+        measure(results, f"{prune.__name__}_next", lambda prune=prune: asyncio.run(prune(manager, settings)), **labels)
+    manager.close()
+    tracemalloc.stop()
+    return results
+
+
+def print_result(result: dict, baseline: dict | None = None):
+    line = f"{result['scale']:>9} {result['features']:>5} {result['operation']:<22} {result['seconds']:>10.4f}s"
+    per_op = f"{result['per_op_seconds'] * 1e6:.2f}us/op" if result["count"] > 1 else ""
+    line += f" {per_op:>14}"
+    if "peak_bytes" in result:
+        line += f" {result['peak_bytes'] / 2**20:>10.1f}MiB"
+    if baseline is not None:
+        line += f" {result['seconds'] / baseline['seconds']:>8.2f}x"
+    print(line)
+
+
+def compare(results: list[dict], baseline_path: Path):
+    """Print the time of every result relative to the same operation in an earlier run."""
+    baseline = {
+        (result["scale"], result["features"], result["operation"]): result
+        for result in json.loads(baseline_path.read_text())["results"]
+    }
+    print(f"Compared to {baseline_path}, time relative to the baseline:")
+    for result in results:
+        previous = baseline.get((result["scale"], result["features"], result["operation"]))
+        if previous is not None:
+            print_result(result, previous)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000], help="Number of jobs")
+    parser.add_argument("--features", type=int, nargs="+", default=[10], help="Features in every spec")
+    parser.add_argument("--store", choices=["file", "sqlite"], default="file")
+    parser.add_argument("--submit", type=int, default=1000, help="Specs submitted for job_from_spec")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Only time, tracemalloc slows Python down")
+    parser.add_argument("--json", type=Path, help="Write the results to this file")
+    parser.add_argument("--compare", type=Path, help="Compare with the results in this file")
+    args = parser.parse_args()
+
+    results = []
+    for features in args.features:
+        for scale in args.scales:
+            with tempfile.TemporaryDirectory(prefix="cycax_scale_") as var_dir:
+                results.extend(run_scale(Path(var_dir), args, scale, features))
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        arguments = {"scales": args.scales, "features": args.features, "store": args.store, "submit": args.submit}
+        arguments["tracemalloc"] = not args.no_tracemalloc
+        args.json.write_text(json.dumps({"arguments": arguments, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Stream zip archives of artifacts without temporary files."""
+
+import io
+import logging
+import zipfile
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from cycax_server.internal.artifact_store import CHUNK_SIZE
+
+
+class _ChunkWriter(io.RawIOBase):
+    """A write-only stream that keeps what is written until it is taken.
+
+    It can not seek, so zipfile writes the sizes and CRCs of the members after their data.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        """Take everything written since the last call."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(files: Iterable[tuple[str, Path]], compression: int = zipfile.ZIP_STORED) -> Iterator[bytes]:
+    """Generate a zip archive of files, chunk by chunk.
+
+    Only one chunk of a file is in memory at a time. The reads block, iterate in a thread in async code. Files that
+    disappear before they are added are left out.
+
+    Args:
+        files: The name in the archive and the path of each file.
+        compression: The zipfile compression method.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, "w", compression=compression) as archive:
+        for name, path in files:
+            try:
+                fp = path.open("rb")
+            except FileNotFoundError:
+                logging.warning("Artifact %s is gone, leaving it out of the archive", path)
+                continue
+            with fp:
+                info = zipfile.ZipInfo.from_file(path, arcname=name)
+                info.compress_type = compression
+                with archive.open(info, "w") as member:
+                    while chunk := fp.read(CHUNK_SIZE):
+                        member.write(chunk)
+                        if data := writer.take():
+                            yield data
+            # The data descriptor of the member.
+            yield writer.take()
+    # The central directory.
+    yield writer.take()
@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+from cycax_server.internal import metrics
+
+# Artifacts are copied in chunks of this size.
+CHUNK_SIZE = 1024 * 1024
+# Temporary files of uploads not written to for this long are left by a process that stopped, other processes sharing
+# the var_dir may still be writing to newer ones.
+TMP_MAX_AGE_SECONDS = 60 * 60
+
+
+class ArtifactStore:
+    """Store every artifact once, under the SHA-256 hash of its contents.
+
+    Jobs reference a blob through a hard link in the Job directory, so identical artifacts of different Jobs share
+    the disk space and the page cache. The link count of a blob is its reference count, a blob with a link count of
+    one is only referenced by the store and can be reclaimed.
+    """
+
+    def __init__(self, blobs_path: Path):
+        self._blobs_path = blobs_path
+        self._tmp_path = blobs_path / "tmp"
+        # Blobs that lost a reference and may be unreferenced.
+        self._released: set[str] = set()
+        self._lock = threading.Lock()
+
+    def blob_path(self, sha256: str) -> Path:
+        """The path of the blob with the given hash."""
+        return self._blobs_path / sha256[:2] / sha256
+
+    def load(self):
+        """Find the blobs left by a previous run, they are checked for references on the next reclaim.
+
+        The temporary files of uploads that were abandoned are removed.
+        """
+        if not self._blobs_path.exists():
+            return
+        size = 0
+        with self._lock:
+            for prefix_path in self._blobs_path.iterdir():
+                if prefix_path != self._tmp_path and prefix_path.is_dir():
+                    for path in prefix_path.iterdir():
+                        self._released.add(path.name)
+                        size += path.stat().st_size
+        metrics.artifact_store_bytes.set(size)
+        if self._tmp_path.exists():
+            stale = time.time() - TMP_MAX_AGE_SECONDS
+            for path in self._tmp_path.iterdir():
+                try:
+                    if path.stat().st_mtime < stale:
+                        path.unlink()
+                except FileNotFoundError:
+                    # The upload finished in another process.
+                    continue
+
+    def ingest(self, fileobj: BinaryIO, filepath: Path) -> tuple[str, int]:
+        """Add the contents of a file object to the store and make filepath a reference to it.
+
+        The contents are copied in chunks to a temporary file while they are hashed, the file becomes the blob when
+        there is no blob with the same contents yet. What is at filepath is replaced. The copy blocks, call it from
+        a thread in async code.
+
+        Returns:
+            The SHA-256 hash and size of the contents.
+        """
+        self._tmp_path.mkdir(exist_ok=True, parents=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self._tmp_path, delete=False) as fp:
+            try:
+                while chunk := fileobj.read(CHUNK_SIZE):
+                    fp.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+            except BaseException:
+                Path(fp.name).unlink()
+                raise
+        digest = sha256.hexdigest()
+        blob_path = self.blob_path(digest)
+        with self._lock:
+            if blob_path.exists():
+                Path(fp.name).unlink()
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                os.replace(fp.name, blob_path)
+                metrics.artifact_store_bytes.inc(size)
+            self._link(blob_path, filepath)
+        return digest, size
+
+    def _link(self, blob_path: Path, filepath: Path):
+        """Make filepath a hard link to a blob, falls back to a copy when hard links are not supported."""
+        tmp_path = filepath.with_name(f".{filepath.name}.{blob_path.name[:8]}")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            tmp_path.hardlink_to(blob_path)
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            logging.warning("Can not link %s, copying it: %s", blob_path, error)
+            shutil.copyfile(blob_path, tmp_path)
+        os.replace(tmp_path, filepath)
+
+    def release(self, sha256: str):
+        """Note that a reference to a blob was removed, the blob is reclaimed if it is no longer referenced."""
+        with self._lock:
+            self._released.add(sha256)
+
+    def reclaim(self) -> int:
+        """Remove the released blobs that are no longer referenced by any Job.
+
+        Returns:
+            The number of bytes freed.
+        """
+        freed = 0
+        with self._lock:
+            released, self._released = self._released, set()
+            for sha256 in released:
+                blob_path = self.blob_path(sha256)
+                try:
+                    stat = blob_path.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_nlink <= 1:
+                    blob_path.unlink()
+                    freed += stat.st_size
+        metrics.artifact_store_bytes.dec(freed)
+        if freed:
+            logging.info("Reclaimed %s bytes of unreferenced artifacts", freed)
+        return freed
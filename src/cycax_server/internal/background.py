@@ -6,32 +6,96 @@ import asyncio
 import logging
 import time
 
-from cycax_server.internal.job_manager import JobManager, JobState
+from cycax_server.internal import metrics
+from cycax_server.internal.job_manager import RUNNING_TIMEOUT_SECONDS, JobManager, JobState
 from cycax_server.internal.settings import Settings
 
 
 async def prune_old_jobs(manager: JobManager, settings: Settings):
     logging.info("Checking if there are any old jobs that need to be deleted.")
-    for job in manager.list_jobs():
-        if job.get_age_hours() > settings.keep_age_hours:
+    # Only the Jobs that became old enough since the last pass are checked.
+    for job in manager.take_due_jobs("expiry"):
+        if job.get_age_hours() > settings.keep_age_hours and not manager.list_waiting_dependents(job.job_id):
             manager.delete_job(job.job_id)
+        else:
+            # The Job was updated after it was scheduled, or an assembly still waits for the part.
+            manager.schedule_expiry(job)
         await asyncio.sleep(0)
+    # Remove the artifacts that are no longer used by any Job.
+    await asyncio.to_thread(manager.artifact_store.reclaim)
 
 
 async def prune_stuck_jobs(manager: JobManager, *_args):
     logging.info("Checking if there are any stuck jobs that need to be set to CREATED.")
-    # Reset Jobs marked as completed but that has no artifacts.
-    for job in manager.list_jobs(states_in=[JobState.COMPLETED]):
-        if len(job.list_artifacts()) == 0:
+    # Reset Jobs marked as completed but that has no artifacts, each Job is checked once after it completed.
+    for job in manager.take_due_jobs("completed"):
+        if job.state == JobState.COMPLETED and len(job.list_artifacts()) == 0:
             job.reset()
 
     await asyncio.sleep(0)  # Service requests
-    # Reset Jobs that have been in running for 5 minutes.
-    for job in manager.list_jobs(states_in=[JobState.RUNNING]):
-        logging.info("Running job %s", job.job_id)
-        age = time.time() - job.state_changed_at
-        if age > 300:  # noqa: PLR2004 - 300s is 5 minutes.
+    # Hand tasks out again when the worker that claimed them has not finished in time.
+    for job in manager.take_due_jobs("lease"):
+        for task_name in job.list_expired_leases():
+            if manager.expire_lease(job, task_name):
+                logging.warning("Lease on task %s of job %s expired", task_name, job.job_id)
+        # The leases that were renewed or given out after the Job was scheduled.
+        lease_expiry = job.get_first_lease_expiry()
+        if lease_expiry is not None:
+            manager.schedule("lease", job, lease_expiry)
+
+    await asyncio.sleep(0)  # Service requests
+    # Reset Jobs that have been in running for 5 minutes, a worker sending heartbeats for a task keeps its Job running.
+    for job in manager.take_due_jobs("running"):
+        if job.state != JobState.RUNNING:
+            continue
+        now = time.time()
+        last_lease_expiry = job.get_last_lease_expiry()
+        if now - job.state_changed_at > RUNNING_TIMEOUT_SECONDS and (
+            last_lease_expiry is None or last_lease_expiry < now
+        ):
+            logging.info("Running job %s", job.job_id)
             job.reset()
+        else:
+            # The Job started running again after it was scheduled.
+            manager.schedule_state_checks(job)
+
+
+async def checkpoint(manager: JobManager, *_args):
+    # The state changes are written by the state flusher alone, two writers could write the states out of order.
+    logging.info("Writing a checkpoint of the job registry.")
+    await asyncio.to_thread(manager.checkpoint)
+
+
+async def run_state_flusher(manager: JobManager, settings: Settings):
+    """Periodically write the Job states that changed to the store, off the event loop.
+
+    When the flusher is cancelled it first finishes the write in progress, the states written at shutdown are newer.
+    """
+    if settings.state_flush_interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(settings.state_flush_interval)
+        states = manager.take_dirty_states()
+        if states:
+            write = asyncio.ensure_future(asyncio.to_thread(manager.write_states, states))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                await write
+                raise
+
+
+async def run_store_sync(manager: JobManager, settings: Settings):
+    """Periodically pick up the changes other server processes made to the shared store."""
+    if not settings.shared_store:
+        return
+    while True:
+        await asyncio.sleep(settings.store_sync_interval)
+        try:
+            changes = await asyncio.to_thread(manager.load_changes)
+            manager.apply_changes(changes)
+        except Exception:
+            logging.exception("Could not sync with the shared store")
 
 
 async def run_background_tasks(*, running: bool, manager: JobManager, settings: Settings):
@@ -39,13 +103,15 @@ async def run_background_tasks(*, running: bool, manager: JobManager, settings:
     bg_task_spec_list = [
         {"last": time.time(), "every": 600, "func": prune_old_jobs},
         {"last": time.time(), "every": 60, "func": prune_stuck_jobs},
+        {"last": time.time(), "every": 900, "func": checkpoint},
     ]
     while running:
         await asyncio.sleep(30)
         for bg_task in bg_task_spec_list:
             if (time.time() - bg_task["last"]) > bg_task["every"]:
                 try:
-                    await bg_task["func"](manager, settings)
+                    with metrics.background_task_seconds.labels(bg_task["func"].__name__).time():
+                        await bg_task["func"](manager, settings)
                 except Exception as error:
                     logging.error("Error running background task %s: %s", bg_task["func"].__name__, error)
                 bg_task["last"] = time.time()
@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Derive the Job ID from a Part Specification.
+
+Only the features and parts of a spec determine the Job ID, two specs that describe the same geometry get the same
+Job and are only rendered once. The spec is serialized canonically before it is hashed: keys are sorted and floats
+with an integral value are written as integers, so 1 and 1.0 and a different key order give the same ID.
+
+The ID scheme is versioned by a prefix:
+
+- sha1: 40 hex digits, the SHA-1 of the canonical serialization.
+- blake2b: "b2-" and 40 hex digits, the 160 bit BLAKE2b of the canonical serialization.
+
+IDs created before the canonical serialization are the SHA-1 of the plain serialization, see legacy_job_id. The IDs
+a spec may have from before a change of scheme are given by previous_job_ids.
+"""
+
+import hashlib
+import json
+
+BLAKE2B_PREFIX = "b2-"
+
+
+def canonicalize(value):
+    """Normalize a JSON value so equal values serialize the same."""
+    if isinstance(value, dict):
+        return {str(key): canonicalize(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return [canonicalize(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def canonical_json(value) -> bytes:
+    """Serialize a JSON value canonically."""
+    return json.dumps(canonicalize(value), sort_keys=True, separators=(",", ":")).encode()
+
+
+def job_id_from_spec(spec: dict, scheme: str = "sha1") -> str:
+    """Get the Job ID of a Part Specification.
+
+    Args:
+        spec: The Part Specification.
+        scheme: The ID scheme, sha1 or blake2b.
+
+    Returns:
+        The Job ID.
+    """
+    if scheme == "blake2b":
+        spec_hash = hashlib.blake2b(digest_size=20)
+        prefix = BLAKE2B_PREFIX
+    else:
+        spec_hash = hashlib.sha1()  # noqa: S324 - Not used for security.
+        prefix = ""
+    spec_hash.update(canonical_json(spec.get("features") or []))
+    spec_hash.update(canonical_json(spec.get("parts") or []))
+    return prefix + spec_hash.hexdigest()
+
+
+def legacy_job_id(spec: dict) -> str:
+    """Get the Job ID a Part Specification had before the serialization was canonical."""
+    sha1hash = hashlib.sha1()  # noqa: S324 - Not used for security.
+    sha1hash.update(json.dumps(spec.get("features", [])).encode())
+    sha1hash.update(json.dumps(spec.get("parts", [])).encode())
+    return sha1hash.hexdigest()
+
+
+def previous_job_ids(spec: dict, scheme: str = "sha1") -> list[str]:
+    """Get the IDs a Part Specification may have been given under the schemes used before, newest first.
+
+    Args:
+        spec: The Part Specification.
+        scheme: The ID scheme in use, the canonical sha1 ID is only a previous ID for the other schemes.
+    """
+    job_ids = []
+    if scheme != "sha1":
+        job_ids.append(job_id_from_spec(spec, "sha1"))
+    job_ids.append(legacy_job_id(spec))
+    return job_ids
@@ -2,20 +2,45 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 import hashlib
+import heapq
 import json
 import logging
+import secrets
+import threading
 import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import UTC, datetime
 from enum import Enum
 from pathlib import Path
-from typing import ClassVar
+from typing import BinaryIO, Literal, get_args
 
+from cycax_server.internal import metrics
+from cycax_server.internal.artifact_store import CHUNK_SIZE, ArtifactStore
+from cycax_server.internal.job_id import job_id_from_spec, previous_job_ids
+from cycax_server.internal.job_store import (
+    METADATA_FILENAMES,
+    FileJobStore,
+    JobStore,
+    SharedJobStore,
+    create_job_store,
+    spec_summary,
+)
+from cycax_server.internal.scheduler import Deadlines, TaskQueue
 from cycax_server.internal.settings import Settings
+from cycax_server.internal.spec_cache import SpecCache
+from cycax_server.internal.task_stats import TaskStats
 
-# Filenames
-PART_FN = "part.json"
-STATE_FN = "state.json"
+# The Job attributes the job list can be ordered by.
+OrderByField = Literal["created_at", "state_changed_at"]
+ORDER_BY_FIELDS = get_args(OrderByField)
+# A Job that is RUNNING for longer than this is reset, unless a worker holds a lease on one of its tasks.
+RUNNING_TIMEOUT_SECONDS = 300
+# What the background tasks check Jobs for: that they are old enough to delete, that a COMPLETED Job has artifacts,
+# that a lease expired and that a Job is RUNNING for too long.
+DEADLINE_KINDS = ("expiry", "completed", "lease", "running")
 
 
 class JobState(str, Enum):
@@ -26,24 +51,96 @@ class JobState(str, Enum):
 
 class TaskState(str, Enum):
     CREATED = "CREATED"
+    # The task can not be handed out before the Jobs it depends on are completed.
+    WAITING = "WAITING"
     TAKEN = "TAKEN"
     RUNNING = "RUNNING"
     COMPLETED = "COMPLETED"
 
 
+class StateConflictError(Exception):
+    """A state change was not written to a shared store, another process changed the Job at the same time."""
+
+
+class LeaseTokenError(Exception):
+    """A task update was not sent with the token of the lease on the task, the worker does not hold the lease."""
+
+
+# The task states a worker sets with the lease token it claimed the task with.
+LEASED_UPDATE_STATES = (TaskState.TAKEN, TaskState.RUNNING, TaskState.COMPLETED)
+# The task states of tasks that are handed out to a worker.
+ACTIVE_TASK_STATES = (TaskState.TAKEN, TaskState.RUNNING)
+ACTIVE_STATE_NAMES = tuple(state.value for state in ACTIVE_TASK_STATES)
+
+
+def state_name(state: JobState | TaskState | str | None) -> str:
+    """The name of a Job or task state, states loaded from the store are plain strings."""
+    if state is None:
+        return "NONE"
+    return state.value if isinstance(state, Enum) else state
+
+
+def task_durations(times: dict[str, float]) -> tuple[float | None, float | None]:
+    """How long a task waited in the queue and how long the worker took, from the times it entered its states.
+
+    The wait is from CREATED to TAKEN. The worker started when the task was taken, or set to RUNNING when it was not
+    taken first, and finished when the task was COMPLETED. Times from before the task was last CREATED are from an
+    earlier run of the task.
+
+    Returns:
+        The wait and the run time in seconds, None when not known.
+    """
+    created_at = times.get(TaskState.CREATED.value, 0)
+    wait = run = None
+    taken_at = times.get(TaskState.TAKEN.value)
+    if created_at and taken_at is not None and taken_at >= created_at:
+        wait = taken_at - created_at
+    started = [times[name] for name in ACTIVE_STATE_NAMES if name in times and times[name] >= created_at]
+    completed_at = times.get(TaskState.COMPLETED.value)
+    if started and completed_at is not None and completed_at >= min(started):
+        run = completed_at - min(started)
+    return wait, run
+
+
 class Job:
     """A job."""
 
-    def __init__(self, jobs_path: Path, job_id: str):
+    def __init__(
+        self,
+        jobs_path: Path,
+        job_id: str,
+        manager: "JobManager | None" = None,
+        store: JobStore | None = None,
+        artifact_store: ArtifactStore | None = None,
+    ):
         self._jobs_path: Path = jobs_path
+        self._manager: JobManager | None = manager
+        self._store: JobStore = store if store is not None else FileJobStore(jobs_path)
+        if artifact_store is None:
+            artifact_store = ArtifactStore(jobs_path.parent / "blobs")
+        self._artifact_store: ArtifactStore = artifact_store
         self._last_updated: float | None = None
         self.job_id: str = job_id
-        self.artifacts: dict = {}
+        # Artifact name to artifact info: path, size, sha256 and mtime.
+        self.artifacts: dict[str, dict] = {}
         self.part_name: str | None = None
         self._job_path: Path = jobs_path / job_id
         self._tasks: dict = {}
+        self._leases: dict[str, float] = {}
+        # The token each lease was handed out with, the worker holding the lease sends it with its updates.
+        self._lease_tokens: dict[str, str] = {}
+        # The tasks whose state changed since the state was last written to the store, to the state they had before.
+        self._changed_tasks: dict[str, TaskState | str | None] = {}
+        # The time each task last entered each of its states, by task name and state name.
+        self._task_times: dict[str, dict[str, float]] = {}
+        # The IDs of the Jobs for the parts of an assembly, the tasks wait until these Jobs are completed.
+        self.depends_on: list[str] = []
+        # Tasks of Jobs with a higher priority are handed out first.
+        self.priority: int = 0
+        self.submitter: str | None = None
         self.state: JobState = JobState.CREATED
         self.state_changed_at = time.time()
+        self.created_at = time.time()
         self.feature_count: int = 0
         self.parts_count: int = 0
 
@@ -53,25 +150,41 @@ class Job:
         else:
             return self.job_id
 
-    def dump(self, *, short=False) -> dict:
-        """Dump the job information to a dictionary."""
+    def dump(self, *, short=False, fields: list[str] | None = None) -> dict:
+        """Dump the job information to a dictionary.
+
+        Args:
+            short: Leave out the attributes that are only of interest when looking at a single job.
+            fields: Only add these attributes, add all the attributes when None.
+        """
+        attribute_getters = {
+            "last_updated": self._dump_last_updated,
+            "created_at": lambda: datetime.fromtimestamp(self.created_at, tz=UTC).isoformat(),
+            "state_changed_at": lambda: datetime.fromtimestamp(self.state_changed_at, tz=UTC).isoformat(),
+            "state": self.get_state,
+            "part_name": lambda: self.part_name,
+            "feature_count": lambda: self.feature_count,
+            "part_count": lambda: self.parts_count,
+            "depends_on": lambda: list(self.depends_on),
+            "priority": lambda: self.priority,
+            "submitter": lambda: self.submitter,
+        }
+        if not short:
+            attribute_getters["path"] = lambda: self._job_path
         info = {}
         info["id"] = self.job_id
         info["type"] = "job"
         info["attributes"] = {}
-        if self._last_updated is None:
-            last = datetime.now(tz=UTC).isoformat()
-        else:
-            last = datetime.fromtimestamp(self._last_updated, tz=UTC).isoformat()
-        info["attributes"]["last_updated"] = last
-        info["attributes"]["state"] = self.get_state()
-        info["attributes"]["part_name"] = self.part_name
-        info["attributes"]["feature_count"] = self.feature_count
-        info["attributes"]["part_count"] = self.parts_count
-        if not short:
-            info["attributes"]["path"] = self._job_path
+        for name, getter in attribute_getters.items():
+            if fields is None or name in fields:
+                info["attributes"][name] = getter()
         return info
 
+    def _dump_last_updated(self) -> str:
+        if self._last_updated is None:
+            return datetime.now(tz=UTC).isoformat()
+        return datetime.fromtimestamp(self._last_updated, tz=UTC).isoformat()
+
     def get_age_hours(self) -> int:
         """Get the number of full hours that elapsed since the job was last updated.
 
@@ -80,54 +193,116 @@ class Job:
         """
         if self._last_updated is None:
             return 0
-        delta = datetime.now(tz=UTC) - datetime.fromtimestamp(self._last_updated, tz=UTC)
-        return int(delta.total_seconds() // 3600)
+        return int((time.time() - self._last_updated) // 3600)
+
+    def get_expiry_time(self, keep_age_hours: int) -> float:
+        """Get the time the Job becomes older than keep_age_hours, see get_age_hours.
+
+        When it is not known when the Job was last updated its age is 0, the time is keep_age_hours from now.
+        """
+        last_updated = time.time() if self._last_updated is None else self._last_updated
+        return last_updated + (keep_age_hours + 1) * 3600
 
     def get_spec(self) -> dict:
-        """Load the job specification from disk and return it."""
-        spec_file = self._job_path / PART_FN
+        """Load the job specification and return it."""
+        return json.loads(self.get_spec_json())
+
+    def get_spec_json(self) -> bytes:
+        """Load the job specification as JSON, from the registry's spec cache when possible."""
         if self._last_updated is None:
-            self._last_updated = self._job_path.stat().st_mtime
-        return json.loads(spec_file.read_text())
+            self._last_updated = self._store.get_mtime(self.job_id)
+        spec_cache = None if self._manager is None else self._manager.spec_cache
+        if spec_cache is not None:
+            spec_json = spec_cache.get(self.job_id)
+            if spec_json is not None:
+                return spec_json
+        spec_json = self._store.load_spec_json(self.job_id)
+        if spec_cache is not None:
+            spec_cache.put(self.job_id, spec_json)
+        return spec_json
 
     def get_state(self) -> dict:
-        state_map = {"job": self.state, "tasks": self._tasks}
+        state_map = {"job": self.state, "tasks": dict(self._tasks)}
         return state_map
 
-    def load(self):
-        """Load the job from disk and initialize the Job object."""
-        spec = self.get_spec()
-        self.part_name = spec.get("name")
-        features = spec.get("feature_count")
-        if features:
-            self.feature_count = len(features)
-        else:
-            self.feature_count = 0
-        parts = spec.get("part_count")
-        if parts:
-            self.part_count = len(parts)
-        else:
-            self.part_count = 0
+    def get_store_state(self) -> dict:
+        """Get the state as it is saved to the store, the Job and task states and how the Job is scheduled."""
+        state_map = self.get_state()
+        state_map["state_changed_at"] = self.state_changed_at
+        if self.depends_on:
+            state_map["depends_on"] = list(self.depends_on)
+        if self.priority:
+            state_map["priority"] = self.priority
+        if self.submitter is not None:
+            state_map["submitter"] = self.submitter
+        if self._task_times:
+            state_map["task_times"] = {name: dict(times) for name, times in self._task_times.items()}
+        if self._leases:
+            state_map["leases"] = dict(self._leases)
+        if self._lease_tokens:
+            state_map["lease_tokens"] = dict(self._lease_tokens)
+        return state_map
 
-        state_path = self._job_path / STATE_FN
-        if state_path.exists():
-            state_map = json.loads(state_path.read_text())
-        else:
-            state_map = {}
+    @property
+    def share_key(self) -> str:
+        """The key the tasks are shared fairly by, the submitter or the part name when the submitter is not known."""
+        return self.submitter or self.part_name or ""
 
-        self.state = state_map.get("job", JobState.CREATED)
+    def load(self):
+        """Load the job from the store and initialize the Job object."""
+        self.load_record(self._store.load_record(self.job_id))
+
+    def load_record(self, record: dict):
+        """Initialize the Job object from a job record, see job_store for the format."""
+        self.part_name = record["part_name"]
+        self.feature_count = record["feature_count"]
+        self.parts_count = record["part_count"]
+        self.created_at = record["created_at"]
+        self._last_updated = record["last_updated"]
+        for name, info in record["artifacts"].items():
+            self.artifacts[name] = {"path": self._job_path / name, **info}
+        state_map = record["state"]
+        # Records from before the time was saved only have the time the Job was last written.
+        self.state_changed_at = state_map.get("state_changed_at", record["last_updated"])
+        self.depends_on = list(state_map.get("depends_on", []))
+        self.priority = state_map.get("priority", 0)
+        self.submitter = state_map.get("submitter")
+        self._update_state(state_map.get("job", JobState.CREATED))
+        task_times = state_map.get("task_times", {})
         for task_name, task_state in state_map.get("tasks", {}).items():
-            self.set_task_state(task_name, task_state, save=False)
-        self.set_state()
-        self.save_state()
+            times = task_times.get(task_name, {})
+            self._task_times.setdefault(task_name.lower(), {}).update(times)
+            self.set_task_state(task_name, task_state, save=False, changed_at=times.get(task_state))
+        # The leases are renewed by heartbeats to any process sharing the store.
+        self._leases = {
+            name.lower(): expires_at
+            for name, expires_at in state_map.get("leases", {}).items()
+            if self._tasks.get(name.lower()) in ACTIVE_TASK_STATES
+        }
+        self._lease_tokens = {
+            name.lower(): token
+            for name, token in state_map.get("lease_tokens", {}).items()
+            if self._tasks.get(name.lower()) in ACTIVE_TASK_STATES
+        }
+        lease_expiry = self.get_first_lease_expiry()
+        if self._manager is not None and lease_expiry is not None:
+            self._manager.schedule("lease", self, lease_expiry)
+        # The task states are the ones in the store.
+        self._changed_tasks.clear()
+        self.set_state(save=False)
+        if self.state != state_map.get("job"):
+            # The saved state did not match the task states.
+            self.save_state()
 
     def save_state(self):
-        """Save the Job state to disk."""
-        states = {}
-        states["job"] = self.state
-        states["tasks"] = self._tasks
-        state_path = self._job_path / STATE_FN
-        state_path.write_text(json.dumps(states))
+        """Save the Job state to the store.
+
+        When the Job is in a registry the registry's write-behind decides when the state is written.
+        """
+        if self._manager is not None:
+            self._manager.mark_dirty(self)
+        else:
+            self._store.save_state(self.job_id, self.get_store_state())
 
     def set_state(self, state: JobState | str | None = None, *, save: bool = True):
         """Directly update the Job state or look through task states and set accordingly.
@@ -137,7 +312,11 @@ class Job:
             save: Whether to save the state to disk.
         """
         if state is None:
-            task_state_set = set(self._tasks.values())
+            # A task waiting for its dependencies has not started yet.
+            task_state_set = {
+                TaskState.CREATED if task_state == TaskState.WAITING else task_state
+                for task_state in self._tasks.values()
+            }
             if len(task_state_set) == 0:
                 state = JobState.CREATED
             elif len(task_state_set) == 1:
@@ -153,73 +332,312 @@ class Job:
                 state = JobState.RUNNING
         if self.state != state:
             self.state_changed_at = time.time()
-            self.state = state
+            self._update_state(state)
         if save:
             self.save_state()
 
+    def _update_state(self, state: JobState | str):
+        """Change the Job state and keep the registry indexes up to date."""
+        old_state = self.state
+        self.state = state
+        if self._manager is not None and old_state != state:
+            self._manager.job_state_changed(self, old_state)
+
+    def set_priority(self, priority: int):
+        """Change the priority of the Job, the tasks that are not handed out yet are rescheduled."""
+        if priority == self.priority:
+            return
+        self.priority = priority
+        if self._manager is not None:
+            self._manager.job_priority_changed(self)
+        self.save_state()
+
     def reset(self):
-        self.state = JobState.CREATED
+        self._update_state(JobState.CREATED)
         self.state_changed_at = time.time()
-        for key in self._tasks.keys():
-            self.set_task_state(key, TaskState.CREATED)
+        self._leases.clear()
+        self._lease_tokens.clear()
+        task_names = list(self._tasks.keys())
+        for key in task_names:
+            task_state = TaskState.CREATED
+            if self._manager is not None:
+                task_state = self._manager.initial_task_state(self, key, task_names)
+            self.set_task_state(key, task_state)
 
     def get_tasks(self) -> dict:
         """Get the tasks associated with this Job."""
         return self._tasks
 
-    def set_task_state(self, name: str, state: TaskState | None = None, *, save: bool = True):
+    def set_task_state(
+        self,
+        name: str,
+        state: TaskState | None = None,
+        *,
+        save: bool = True,
+        changed_at: float | None = None,
+    ):
         """Set the state of a task.
 
         Args:
             name: The name of the task.
             state: The state to set the task to.
             save: Whether to save the state to disk.
+            changed_at: The time the task entered the state, now when None.
         """
         if state is None:
             # Make sure it exists.
             state = self._tasks.get(name.lower(), TaskState.CREATED)
+        old_state = self._tasks.get(name.lower())
         self._tasks[name.lower()] = state
+        self._changed_tasks.setdefault(name.lower(), old_state)
+        if old_state != state:
+            self._task_times.setdefault(name.lower(), {})[state_name(state)] = changed_at or time.time()
+        if self._manager is not None and old_state != state:
+            self._manager.task_state_changed(self, name.lower(), old_state)
+        if state not in ACTIVE_TASK_STATES:
+            self._leases.pop(name.lower(), None)
+            self._lease_tokens.pop(name.lower(), None)
+        if state == TaskState.CREATED and self._manager is not None:
+            self._manager.notify_task_created(name)
         if save:
             self.set_state()
-            self.save_state()
+
+    def get_task_times(self, name: str) -> dict[str, float]:
+        """Get the time a task last entered each of its states, by state name."""
+        return self._task_times.get(name.lower(), {})
+
+    def get_timeline(self) -> list[dict]:
+        """Get the task state changes of the Job in the order they happened, the last time each state was entered."""
+        events = [
+            {"task": name, "state": task_state, "at": changed_at}
+            for name, times in self._task_times.items()
+            for task_state, changed_at in times.items()
+        ]
+        events.sort(key=lambda event: event["at"])
+        return events
+
+    def take_changed_tasks(self) -> dict[str, TaskState | str | None]:
+        """Get the tasks that changed since the last call, the state of these is written to the store.
+
+        Returns:
+            The task names to the state the tasks had before they changed, None for a new task.
+        """
+        changed_tasks, self._changed_tasks = self._changed_tasks, {}
+        return changed_tasks
+
+    def restore_changed_tasks(self, changed_tasks: dict[str, TaskState | str | None]):
+        """Mark tasks taken with take_changed_tasks as changed again, their state could not be written."""
+        for name, old_state in changed_tasks.items():
+            self._changed_tasks.setdefault(name, old_state)
+
+    def lease_task(self, name: str, seconds: float, token: str | None = None) -> float:
+        """Mark a task as TAKEN and give the worker a time-bounded lease on it.
+
+        Args:
+            name: The name of the task.
+            seconds: How long the lease is valid for.
+            token: The token of the lease, the worker sends it with its updates. A new token when None.
+
+        Returns:
+            The time the lease expires at, as a UNIX timestamp.
+        """
+        expires_at = time.time() + seconds
+        # The lease is saved with the task state.
+        self._leases[name.lower()] = expires_at
+        self._lease_tokens[name.lower()] = token if token is not None else secrets.token_urlsafe(16)
+        self.set_task_state(name, TaskState.TAKEN)
+        if self._manager is not None:
+            self._manager.schedule("lease", self, expires_at)
+        return expires_at
+
+    def renew_lease(self, name: str, seconds: float) -> float:
+        """Extend the lease on a TAKEN or RUNNING task, a worker sends heartbeats while it works on the task.
+
+        The lease is saved to the store, with a shared store the heartbeats may be sent to any of the processes.
+
+        Returns:
+            The time the lease expires at, as a UNIX timestamp.
+        """
+        expires_at = time.time() + seconds
+        self._leases[name.lower()] = expires_at
+        if self._manager is not None:
+            self._manager.schedule("lease", self, expires_at)
+        self.save_state()
+        return expires_at
+
+    def get_lease(self, name: str) -> float | None:
+        """Get the time the lease on a task expires, None if the task is not leased."""
+        return self._leases.get(name.lower())
+
+    def get_lease_token(self, name: str) -> str | None:
+        """Get the token the lease on a task was handed out with, None if the task is not leased."""
+        return self._lease_tokens.get(name.lower())
+
+    def get_first_lease_expiry(self) -> float | None:
+        """Get the time the first lease on a task of the Job expires, None if no task is leased."""
+        return min(self._leases.values(), default=None)
+
+    def get_last_lease_expiry(self) -> float | None:
+        """Get the time the last lease on a task of the Job expires, None if no task is leased."""
+        return max(self._leases.values(), default=None)
+
+    def list_expired_leases(self, now: float | None = None) -> list[str]:
+        """List the tasks whose lease has expired."""
+        if now is None:
+            now = time.time()
+        return [name for name, expires_at in self._leases.items() if expires_at < now]
 
     def save_spec(self, spec: dict):
         """Save the Part Spec this Job is for."""
-        self.part_name = spec.get("name")
-        self._job_path.mkdir(exist_ok=True, parents=True)
-        spec_file = self._job_path / PART_FN
-        spec_file.write_text(json.dumps(spec))
+        summary = spec_summary(spec)
+        self.part_name = summary["part_name"]
+        self.feature_count = summary["feature_count"]
+        self.parts_count = summary["part_count"]
+        if self._manager is not None:
+            self._manager.save_spec(self.job_id, spec)
+        else:
+            self._store.save_spec(self.job_id, spec)
 
     def delete(self):
-        """Delete the Job, remove all files and then remove the directory."""
+        """Delete the Job, remove it from the store, remove all files and then remove the directory."""
+        self._store.delete(self.job_id)
+        if self._manager is not None:
+            self._manager.spec_cache.invalidate(self.job_id)
+        for info in self.artifacts.values():
+            if info["sha256"] is not None:
+                self._artifact_store.release(info["sha256"])
         if self._job_path.exists():
             for filepath in self._job_path.iterdir():
                 filepath.unlink()
             self._job_path.rmdir()
 
     def artifact_filepath(self, name: str) -> Path:
-        # TODO: Check the artifact path.
-        filepath = self._job_path / name
-        self.artifacts[name] = filepath
-        return filepath
+        """Get the path an artifact is stored at.
+
+        Raises:
+            ValueError: When the name is not a valid artifact name.
+        """
+        if not name or name != Path(name).name or name.startswith(".") or name in METADATA_FILENAMES:
+            msg = f"Invalid artifact name {name!r}"
+            raise ValueError(msg)
+        self._job_path.mkdir(exist_ok=True, parents=True)
+        return self._job_path / name
+
+    def save_artifact(self, name: str, fileobj: BinaryIO) -> dict:
+        """Save an artifact, copying it from a file object.
+
+        The contents are stored once in the artifact store and linked into the Job directory, see ArtifactStore.
+        The copy blocks, call it from a thread in async code.
+
+        Args:
+            name: The name of the artifact.
+            fileobj: The file object to read the artifact from.
+
+        Returns:
+            The artifact info, with the size and SHA-256 hash of the contents.
+        """
+        filepath = self.artifact_filepath(name)
+        sha256, size = self._artifact_store.ingest(fileobj, filepath)
+        old_info = self.artifacts.get(name)
+        if old_info is not None and old_info["sha256"] not in (None, sha256):
+            self._artifact_store.release(old_info["sha256"])
+        info = {"path": filepath, "size": size, "sha256": sha256, "mtime": filepath.stat().st_mtime}
+        metrics.artifact_bytes_received.inc(size)
+        self.artifacts[name] = info
+        self.save_artifacts()
+        return info
+
+    def get_artifact_manifest(self) -> dict[str, dict]:
+        """The artifact manifest, the size, SHA-256 hash and mtime of every artifact."""
+        return {
+            name: {"size": info["size"], "sha256": info["sha256"], "mtime": info["mtime"]}
+            for name, info in self.artifacts.items()
+        }
+
+    def save_artifacts(self):
+        """Save the artifact manifest to the store, blocks so call it from a thread in async code."""
+        self._store.save_artifacts(self.job_id, self.get_artifact_manifest())
+
+    def hash_artifact(self, name: str) -> dict:
+        """Make sure the artifact info has the size and SHA-256 hash of the artifact.
+
+        Artifacts found on disk at startup have no hash yet, hashing blocks so call it from a thread in async code.
+
+        Returns:
+            The artifact info.
+        """
+        info = self.artifacts[name]
+        if info["sha256"] is None:
+            sha256 = hashlib.sha256()
+            with info["path"].open("rb") as fp:
+                while chunk := fp.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+            stat = info["path"].stat()
+            info.update({"size": stat.st_size, "sha256": sha256.hexdigest(), "mtime": stat.st_mtime})
+            self.save_artifacts()
+        return info
 
     def list_artifacts(self) -> list[str]:
         return list(self.artifacts.keys())
 
-    def get_artifact_path(self, name: str) -> Path:
+    def get_artifact_info(self, name: str) -> dict:
         return self.artifacts[name]
 
+    def get_artifact_path(self, name: str) -> Path:
+        return self.artifacts[name]["path"]
+
 
 class JobManager:
-    """Keep track of all jobs."""
+    """Keep track of all jobs.
 
-    _jobs: ClassVar[dict[str, Job]] = {}
-    _parts: ClassVar[dict[str, dict[str, str]]] = {}
+    The registry is kept in memory. With the shared_store setting several server processes use the same job store,
+    the store is the source of truth: state changes are written as they happen and only over the task states this
+    process saw, tasks are taken from the store in a single atomic step and every process regularly loads the
+    changes made by the others, see sync.
+    """
 
     def __init__(self, settings: Settings):
+        self._jobs: dict[str, Job] = {}
+        self._parts: dict[str, dict[str, dict[str, str]]] = {}
+        # Indexes on the registry, the inner dicts are used as insertion ordered sets of jobs.
+        self._jobs_by_state: dict[str, dict[str, Job]] = {}
+        self._jobs_by_task_state: dict[tuple[str, str], dict[str, Job]] = {}
+        # The job_id of a part Job to the assembly Jobs that depend on it.
+        self._dependents: dict[str, dict[str, Job]] = {}
+        # The task name to the Jobs with a CREATED task of that type, in the order they are handed out.
+        self._task_queues: dict[str, TaskQueue] = {}
         self._settings = settings
+        self._shared = settings.shared_store
+        # The revision of the shared store the registry is up to date with.
+        self._revision = 0
+        # The specs to write at the end of a batch_writes block, None outside the block.
+        self._spec_batch: dict[str, dict] | None = None
         self._parts_path = self._settings.var_dir / "parts"
         self._jobs_path = self._settings.var_dir / "jobs"
+        self._store = create_job_store(settings)
+        # The store shared with the other processes, None when the registry does not share its store.
+        self._shared_store: SharedJobStore | None = None
+        if self._shared:
+            if not isinstance(self._store, SharedJobStore):
+                msg = f"The {settings.job_store} job store can not be shared"
+                raise TypeError(msg)
+            self._shared_store = self._store
+        self.spec_cache = SpecCache(settings.spec_cache_bytes)
+        self.artifact_store = ArtifactStore(self._settings.var_dir / "blobs")
+        # Jobs with state changes that are not written to the store yet.
+        self._dirty: dict[str, Job] = {}
+        # Jobs whose last state change was rejected by the shared store, see check_written.
+        self._rejected_writes: set[str] = set()
+        self._flush_lock = threading.Lock()
+        self._task_waiters: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self.task_stats = TaskStats(settings.task_stats_window)
+        # The Jobs the background tasks check, by what they are checked for and when, see DEADLINE_KINDS.
+        self._deadlines: dict[str, Deadlines] = {kind: Deadlines() for kind in DEADLINE_KINDS}
+        # The task name to the tasks of the same Job it must wait for, from all the pipelines.
+        self._task_after: dict[str, set[str]] = {}
+        for pipeline in settings.task_pipelines.values():
+            for task in pipeline:
+                self._task_after.setdefault(task.name.lower(), set()).update(name.lower() for name in task.after)
 
     def update_from_disk(self):
         var_dir = self._settings.var_dir
@@ -235,13 +653,378 @@ class JobManager:
             logging.warning("PartsDir %s does not exist, creating.....", self._parts_path)
             self._parts_path.mkdir()
 
-        for job_path in self._jobs_path.iterdir():
-            part_spec = job_path / PART_FN
-            if part_spec.exists():
-                job = Job(jobs_path=self._jobs_path, job_id=job_path.name)
-                job.load()
-                logging.warning("Add job %s", str(job))
-                self._jobs[job.job_id] = job
+        self.artifact_store.load()
+        if self._shared_store is not None:
+            self._revision = self._shared_store.get_revision()
+        for record in self._store.load_records():
+            job = self.new_job(record["job_id"])
+            job.load_record(record)
+            logging.info("Add job %s", str(job))
+            self.add_job(job)
+            self.update_part_job_relation(job)
+        self.load_task_stats()
+        # A part may have completed while the state of its assembly was not written yet.
+        for job in self.list_jobs(states_in=[JobState.CREATED]):
+            self.release_waiting_tasks(job)
+
+    def new_job(self, job_id: str) -> Job:
+        """Create a Job object that uses the registry's store, the Job is not added to the registry."""
+        return Job(
+            jobs_path=self._jobs_path,
+            job_id=job_id,
+            manager=self,
+            store=self._store,
+            artifact_store=self.artifact_store,
+        )
+
+    def checkpoint(self):
+        """Let the store persist what makes the next startup faster, can be called from a thread."""
+        with self._flush_lock:
+            self._store.checkpoint()
+
+    def close(self):
+        """Write the outstanding state changes and release the resources held by the registry."""
+        self.flush_states()
+        self.checkpoint()
+        self._store.close()
+
+    def mark_dirty(self, job: Job):
+        """Schedule the state of a Job to be written to the store.
+
+        With a state_flush_interval of 0 or a shared store the state is written immediately.
+        """
+        self._dirty[job.job_id] = job
+        if self._spec_batch is None and (self._shared or self._settings.state_flush_interval <= 0):
+            self.flush_states()
+
+    def save_spec(self, job_id: str, spec: dict):
+        """Save the Part Spec of a Job, at the end of the block in a batch_writes block."""
+        if self._spec_batch is not None:
+            self._spec_batch[job_id] = spec
+        else:
+            self._store.save_spec(job_id, spec)
+        self.spec_cache.invalidate(job_id)
+
+    @contextmanager
+    def batch_writes(self) -> Iterator[None]:
+        """Write the specs of the Jobs created in the with block in one go at the end of the block.
+
+        The states that would be written immediately, with a state_flush_interval of 0 or a shared store, are
+        written after the specs in a single flush.
+        """
+        if self._spec_batch is not None:
+            yield
+            return
+        # Catch up with the other processes once, not for every spec.
+        self.sync()
+        self._spec_batch = {}
+        try:
+            yield
+        finally:
+            specs, self._spec_batch = self._spec_batch, None
+            self._store.save_specs(specs)
+            if self._dirty and (self._shared or self._settings.state_flush_interval <= 0):
+                self.flush_states()
+
+    def take_dirty_states(self) -> dict[str, dict]:
+        """Take a copy of the states that need to be written to the store and mark them clean.
+
+        With a shared store a state only has the tasks changed here and the state they had before, under
+        "expected_tasks", see write_states.
+        """
+        dirty, self._dirty = self._dirty, {}
+        states = {}
+        for job_id, job in dirty.items():
+            states[job_id] = job.get_store_state()
+            changed_tasks = job.take_changed_tasks()
+            if self._shared:
+                # Only write the tasks changed here, other processes may have changed the other tasks.
+                states[job_id]["tasks"] = {
+                    name: task_state for name, task_state in states[job_id]["tasks"].items() if name in changed_tasks
+                }
+                states[job_id]["expected_tasks"] = {
+                    name: None if old_state is None else state_name(old_state)
+                    for name, old_state in changed_tasks.items()
+                }
+        return states
+
+    def write_states(self, states: dict[str, dict]):
+        """Write states taken with take_dirty_states to the store, can be called from a thread.
+
+        The Jobs whose state could not be written are marked dirty again. With a shared store the state of a Job is
+        only written when its tasks are still in the state this process saw before it changed them. Otherwise another
+        process changed the Job after it was last loaded here, the state derived from the out of date view is dropped
+        and check_written raises a StateConflictError for the Job.
+        """
+        if not states:
+            return
+        expected_tasks = {job_id: state.pop("expected_tasks", {}) for job_id, state in states.items()}
+        with self._flush_lock:
+            try:
+                if self._shared_store is not None:
+                    rejected = self._shared_store.compare_and_save_states(states, expected_tasks)
+                    for job_id in rejected:
+                        logging.info("Job %s was changed by another process, its state is not written", job_id)
+                    self._rejected_writes.difference_update(states)
+                    self._rejected_writes.update(rejected)
+                else:
+                    self._store.save_states(states)
+            except Exception:
+                logging.exception("Could not write the state of %s jobs", len(states))
+                for job_id in states:
+                    job = self._jobs.get(job_id)
+                    if job is not None:
+                        job.restore_changed_tasks(expected_tasks[job_id])
+                        self._dirty.setdefault(job_id, job)
+
+    def check_written(self, job: Job):
+        """Check that the last state change of a Job was written to the store.
+
+        Raises:
+            StateConflictError: The write was rejected, another process changed the Job at the same time. The Job is
+                loaded from the store again.
+        """
+        if job.job_id in self._rejected_writes:
+            self._rejected_writes.discard(job.job_id)
+            self._reload_job(job.job_id)
+            msg = f"Job {job.job_id} was changed by another process"
+            raise StateConflictError(msg)
+
+    def update_task_state(
+        self, job: Job, task_name: str, state: TaskState | str | None, lease_token: str | None = None
+    ):
+        """Apply a task state update or heartbeat sent by a worker.
+
+        A leased task is only set to TAKEN, RUNNING or COMPLETED and heartbeats are only accepted with the token of
+        the lease, the token /tasks/claim handed out with the task. An update with a token is rejected once the lease
+        is gone, the task was handed out again or finished.
+
+        With a shared store the Job is loaded from the store first, the update applies to the latest state and not
+        to the view of this process, which may be out of date. Outside a batch_writes block the state is written
+        immediately, in a block call check_written after the block.
+
+        Args:
+            job: The Job of the task.
+            task_name: The name of the task.
+            state: The state to set the task to, None for a heartbeat.
+            lease_token: The token of the lease the worker holds on the task.
+
+        Raises:
+            StateConflictError: The Job was deleted or changed by another process at the same time.
+            LeaseTokenError: The token is not the token of the lease on the task.
+        """
+        if self._shared_store is not None and job.job_id not in self._dirty:
+            # A Job changed earlier in the same batch keeps the change, it is checked when the batch is written.
+            self._reload_job(job.job_id)
+            if self._jobs.get(job.job_id) is not job:
+                msg = f"Job {job.job_id} was deleted by another process"
+                raise StateConflictError(msg)
+        if (state is None or state in LEASED_UPDATE_STATES) and job.get_lease_token(task_name) != lease_token:
+            msg = f"The lease on task {task_name} of job {job.job_id} is not held with this token"
+            raise LeaseTokenError(msg)
+        if state is not None and job.get_tasks().get(task_name.lower()) != state:
+            job.set_task_state(task_name, state)
+        if self._spec_batch is None:
+            self.check_written(job)
+
+    def flush_states(self):
+        """Write all the outstanding state changes to the store."""
+        self.write_states(self.take_dirty_states())
+
+    def add_job(self, job: Job):
+        """Add a Job to the registry and its indexes."""
+        if job.job_id in self._jobs:
+            self._remove_job(job.job_id)
+        self._jobs[job.job_id] = job
+        self._jobs_by_state.setdefault(job.state, {})[job.job_id] = job
+        metrics.jobs.labels(state_name(job.state)).inc()
+        for task_name, task_state in job.get_tasks().items():
+            self._jobs_by_task_state.setdefault((task_name, task_state), {})[job.job_id] = job
+            metrics.tasks.labels(task_name, state_name(task_state)).inc()
+            if task_state == TaskState.CREATED:
+                self._task_queues.setdefault(task_name, TaskQueue()).add(job)
+        for dependency_id in job.depends_on:
+            self._dependents.setdefault(dependency_id, {})[job.job_id] = job
+        self.schedule_expiry(job)
+        self.schedule_state_checks(job)
+        lease_expiry = job.get_first_lease_expiry()
+        if lease_expiry is not None:
+            self.schedule("lease", job, lease_expiry)
+
+    def _remove_job(self, job_id: str):
+        """Remove a Job from the registry and its indexes."""
+        job = self._jobs.pop(job_id)
+        self._jobs_by_state.get(job.state, {}).pop(job_id, None)
+        metrics.jobs.labels(state_name(job.state)).dec()
+        for task_name, task_state in job.get_tasks().items():
+            self._jobs_by_task_state.get((task_name, task_state), {}).pop(job_id, None)
+            metrics.tasks.labels(task_name, state_name(task_state)).dec()
+            if task_name in self._task_queues:
+                self._task_queues[task_name].remove(job_id)
+        for dependency_id in job.depends_on:
+            dependents = self._dependents.get(dependency_id, {})
+            dependents.pop(job_id, None)
+            if not dependents:
+                self._dependents.pop(dependency_id, None)
+        for deadlines in self._deadlines.values():
+            deadlines.discard(job_id)
+
+    def job_state_changed(self, job: Job, old_state: JobState | str):
+        """Move a Job to the right state index, called by the Job when its state changes."""
+        if self._jobs.get(job.job_id) is not job:
+            return
+        self._jobs_by_state.get(old_state, {}).pop(job.job_id, None)
+        self._jobs_by_state.setdefault(job.state, {})[job.job_id] = job
+        metrics.jobs.labels(state_name(old_state)).dec()
+        metrics.jobs.labels(state_name(job.state)).inc()
+        metrics.job_transitions.labels(state_name(old_state), state_name(job.state)).inc()
+        self.schedule_state_checks(job)
+        if job.state == JobState.COMPLETED:
+            for dependent in list(self._dependents.get(job.job_id, {}).values()):
+                self.release_waiting_tasks(dependent)
+
+    def task_state_changed(self, job: Job, task_name: str, old_state: TaskState | str | None):
+        """Move a Job to the right task state index, called by the Job when a task state changes."""
+        if self._jobs.get(job.job_id) is not job:
+            return
+        if old_state is not None:
+            self._jobs_by_task_state.get((task_name, old_state), {}).pop(job.job_id, None)
+        task_state = job.get_tasks()[task_name]
+        self._jobs_by_task_state.setdefault((task_name, task_state), {})[job.job_id] = job
+        self.observe_task_state_change(job, task_name, old_state)
+        if old_state == TaskState.CREATED:
+            self._task_queues[task_name].remove(job.job_id)
+        if task_state == TaskState.CREATED:
+            self._task_queues.setdefault(task_name, TaskQueue()).add(job)
+        if old_state in ACTIVE_TASK_STATES and task_name in self._settings.task_concurrency:
+            # A worker slot became free, a task of this type may be handed out again.
+            self.notify_task_created(task_name)
+        if task_state == TaskState.COMPLETED:
+            self.release_waiting_tasks(job)
+
+    def observe_task_state_change(self, job: Job, task_name: str, old_state: TaskState | str | None):
+        """Update the task metrics for a change in task state."""
+        task_state = job.get_tasks()[task_name]
+        if old_state is not None:
+            metrics.tasks.labels(task_name, state_name(old_state)).dec()
+        metrics.tasks.labels(task_name, state_name(task_state)).inc()
+        metrics.task_transitions.labels(task_name, state_name(old_state), state_name(task_state)).inc()
+        wait, run = task_durations(job.get_task_times(task_name))
+        if task_state == TaskState.TAKEN and old_state == TaskState.CREATED and wait is not None:
+            metrics.task_wait_seconds.labels(task_name).observe(wait)
+            self.task_stats.observe(task_name, "wait_seconds", wait)
+        elif task_state == TaskState.COMPLETED and run is not None:
+            metrics.task_run_seconds.labels(task_name).observe(run)
+            self.task_stats.observe(task_name, "run_seconds", run)
+
+    def load_task_stats(self):
+        """Fill the task statistics with the durations of the tasks in the registry, oldest first."""
+        durations = []
+        for job in self._jobs.values():
+            for task_name in job.get_tasks():
+                times = job.get_task_times(task_name)
+                wait, run = task_durations(times)
+                if wait is not None:
+                    durations.append((times[TaskState.TAKEN.value], task_name, "wait_seconds", wait))
+                if run is not None:
+                    durations.append((times[TaskState.COMPLETED.value], task_name, "run_seconds", run))
+        durations.sort()
+        for _, task_name, kind, seconds in durations:
+            self.task_stats.observe(task_name, kind, seconds)
+
+    def schedule(self, kind: str, job: Job, due: float):
+        """Schedule a background check of a Job, see DEADLINE_KINDS and take_due_jobs.
+
+        A Job is scheduled once per kind, for the earliest time. A later time is ignored until the Job comes up.
+        """
+        if self._jobs.get(job.job_id) is job:
+            self._deadlines[kind].schedule(job.job_id, due)
+
+    def schedule_expiry(self, job: Job):
+        """Schedule a Job to be checked when it becomes older than keep_age_hours."""
+        self.schedule("expiry", job, job.get_expiry_time(self._settings.keep_age_hours))
+
+    def schedule_state_checks(self, job: Job):
+        """Schedule the checks for the state of a Job.
+
+        A COMPLETED Job is checked for artifacts on the next pass, a RUNNING Job when it has run for too long or when
+        the last lease on its tasks expires, whichever is later.
+        """
+        if job.state == JobState.COMPLETED:
+            self.schedule("completed", job, job.state_changed_at)
+        elif job.state == JobState.RUNNING:
+            due = job.state_changed_at + RUNNING_TIMEOUT_SECONDS
+            self.schedule("running", job, max(due, job.get_last_lease_expiry() or due))
+
+    def take_due_jobs(self, kind: str, now: float | None = None) -> list[Job]:
+        """Take the Jobs that are due for a kind of check out of the schedule, the earliest first.
+
+        The caller checks each Job and schedules it again when its deadline moved since it was scheduled.
+        """
+        if now is None:
+            now = time.time()
+        return [self._jobs[job_id] for job_id in self._deadlines[kind].take_due(now) if job_id in self._jobs]
+
+    def job_priority_changed(self, job: Job):
+        """Reschedule the CREATED tasks of a Job, called by the Job when its priority changes."""
+        if self._jobs.get(job.job_id) is not job:
+            return
+        for task_name, task_state in job.get_tasks().items():
+            if task_state == TaskState.CREATED:
+                self._task_queues[task_name].remove(job.job_id)
+                self._task_queues[task_name].add(job)
+
+    def dependencies_completed(self, job: Job) -> bool:
+        """Check if all the Jobs a Job depends on are in the registry and completed."""
+        for dependency_id in job.depends_on:
+            dependency = self._jobs.get(dependency_id)
+            if dependency is None or dependency.state != JobState.COMPLETED:
+                return False
+        return True
+
+    def task_ready(self, job: Job, task_name: str) -> bool:
+        """Check if a task can be handed out, the Jobs and the tasks it waits for are completed."""
+        tasks = job.get_tasks()
+        for after in self._task_after.get(task_name, ()):
+            if tasks.get(after, TaskState.COMPLETED) != TaskState.COMPLETED:
+                return False
+        return self.dependencies_completed(job)
+
+    def initial_task_state(self, job: Job, task_name: str, task_names: list[str]) -> TaskState:
+        """The state a new task starts in, WAITING when it has to wait for other Jobs or for tasks in task_names."""
+        if any(after in task_names for after in self._task_after.get(task_name, ())):
+            return TaskState.WAITING
+        if not self.dependencies_completed(job):
+            return TaskState.WAITING
+        return TaskState.CREATED
+
+    def release_waiting_tasks(self, job: Job):
+        """Make the WAITING tasks of a Job available to workers once what they wait for is completed."""
+        waiting = [name for name, task_state in job.get_tasks().items() if task_state == TaskState.WAITING]
+        for task_name in waiting:
+            if self.task_ready(job, task_name):
+                job.set_task_state(task_name, TaskState.CREATED)
+
+    def pipeline_tasks(self, spec: dict) -> list[str]:
+        """The names of the tasks a Job for the spec gets, in pipeline order.
+
+        A spec with features is a part and a spec with parts an assembly, a spec with both gets the tasks of both
+        pipelines. The FreeCAD task is left out when FreeCAD is not enabled.
+        """
+        job_types = []
+        if spec.get("features"):
+            job_types.append("part")
+        if spec.get("parts"):
+            job_types.append("assembly")
+        task_names = []
+        for job_type in job_types:
+            for task in self._settings.task_pipelines.get(job_type, []):
+                task_name = task.name.lower()
+                if task_name == "freecad" and not self._settings.freecad_enabled:
+                    continue
+                if task_name not in task_names:
+                    task_names.append(task_name)
+        return task_names
 
     def update_part_job_relation(self, job: Job):
         part_name = job.part_name
@@ -271,24 +1054,213 @@ class JobManager:
         Returns:
             A list of jobs.
         """
-        return_jobs = []
+        if states_in is None and not states_not_in:
+            return list(self._jobs.values())
+        if states_in is None:
+            states_in = list(self._jobs_by_state.keys())
         states_not_in_set = set(states_not_in) if states_not_in else set()
-        for job in self._jobs.values():
-            # logging.warning("job %s, states_in %s, states_not_in %s", job, states_in, states_not_in)
-            if job.state in states_not_in_set:
-                continue
-            if states_in is None or job.state in states_in:
-                return_jobs.append(job)
+        return_jobs = []
+        for state in dict.fromkeys(states_in):
+            if state not in states_not_in_set:
+                return_jobs.extend(self._jobs_by_state.get(state, {}).values())
         return return_jobs
 
+    def claim_task(self, task_name: str, lease_seconds: float) -> Job | None:
+        """Hand out the next CREATED task of the given type.
+
+        Tasks of Jobs with a higher priority are handed out first, Jobs with the same priority are shared fairly
+        between the submitters, see TaskQueue. The task is set to TAKEN and leased to the caller in a single step,
+        there is no await between finding the task and taking it so two workers can never be handed the same task.
+
+        No task is handed out while the number of TAKEN and RUNNING tasks of the type is at the limit set in the
+        task_concurrency setting, with a shared store the limit is checked in the store when the task is taken.
+
+        Args:
+            task_name: The name of the task, e.g. freecad.
+            lease_seconds: How long the worker may hold the task before it is handed out again.
+
+        Returns:
+            The Job the task belongs to or None if there are no tasks to hand out.
+        """
+        concurrency = self._settings.task_concurrency.get(task_name.lower())
+        if concurrency is not None and self.count_active_tasks(task_name) >= concurrency:
+            return None
+        task_queue = self._task_queues.get(task_name.lower())
+        while task_queue and (job := task_queue.next()) is not None:
+            lease_token = secrets.token_urlsafe(16)
+            if self._shared_store is None or self._shared_store.take_task(
+                job.job_id, task_name.lower(), max_active=concurrency, lease_token=lease_token
+            ):
+                job.lease_task(task_name, lease_seconds, lease_token)
+                return job
+            # Another process took the task or other processes handed out as many tasks as allowed.
+            logging.info("Task %s of job %s was taken by another process", task_name, job.job_id)
+            self.sync()
+            if concurrency is not None and self.count_active_tasks(task_name) >= concurrency:
+                return None
+            if job.job_id in task_queue:
+                self._reload_job(job.job_id)
+            if job.job_id in task_queue:
+                # The task is not in the store, do not try to hand it out again.
+                logging.warning("Task %s of job %s is not in the store", task_name, job.job_id)
+                task_queue.remove(job.job_id)
+        return None
+
+    def expire_lease(self, job: Job, task_name: str) -> bool:
+        """Hand out a task whose lease expired again, set it to CREATED.
+
+        With a shared store the lease may have been renewed or the task finished through another process. The task is
+        then left as it is and the Job is loaded from the store again.
+
+        Returns:
+            True when the task was set to CREATED.
+        """
+        if self._shared_store is not None and not self._shared_store.expire_lease(job.job_id, task_name, time.time()):
+            logging.info("Lease on task %s of job %s was renewed by another process", task_name, job.job_id)
+            self._reload_job(job.job_id)
+            return False
+        job.set_task_state(task_name, TaskState.CREATED)
+        return True
+
+    def count_active_tasks(self, task_name: str) -> int:
+        """Count the tasks of a type that are handed out to workers, TAKEN or RUNNING."""
+        task_name = task_name.lower()
+        return sum(len(self._jobs_by_task_state.get((task_name, state), {})) for state in ACTIVE_TASK_STATES)
+
+    async def wait_claim_task(self, task_name: str, lease_seconds: float, wait: float) -> Job | None:
+        """Claim a task, waiting up to `wait` seconds for one to become available.
+
+        Args:
+            task_name: The name of the task, e.g. freecad.
+            lease_seconds: How long the worker may hold the task before it is handed out again.
+            wait: The maximum number of seconds to wait for a task.
+
+        Returns:
+            The Job the task belongs to or None if no task became available in time.
+        """
+        deadline = time.monotonic() + wait
+        job = self.claim_task(task_name, lease_seconds)
+        while job is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await self.wait_for_task(task_name, remaining)
+            job = self.claim_task(task_name, lease_seconds)
+        return job
+
+    async def wait_for_task(self, task_name: str, timeout: float) -> bool:
+        """Wait until a task of the given type is set to CREATED or a worker slot for the type becomes free.
+
+        Args:
+            task_name: The name of the task, e.g. freecad.
+            timeout: The maximum number of seconds to wait.
+
+        Returns:
+            True if a task was created, False on timeout.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        waiters = self._task_waiters.setdefault(task_name.lower(), set())
+        waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except TimeoutError:
+            return False
+        finally:
+            waiters.discard(waiter)
+        return True
+
+    def notify_task_created(self, task_name: str):
+        """Wake the workers waiting for a task of the given type, they try to claim one again."""
+        for loop, event in self._task_waiters.get(task_name.lower(), ()):
+            loop.call_soon_threadsafe(event.set)
+
+    def list_jobs_page(
+        self,
+        states_in: list[JobState] | None = None,
+        states_not_in: list[JobState] | None = None,
+        *,
+        order_by: OrderByField = "created_at",
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+    ) -> list[Job]:
+        """List a page of the jobs in the registry in a stable order.
+
+        Args:
+            states_in: A list of states to filter the jobs by. Only return jobs with these states.
+            states_not_in: A list of states to exclude from the jobs. Do not return jobs with these states.
+            order_by: The Job attribute to order by, one of ORDER_BY_FIELDS.
+            after: Only return jobs that sort after this (value, job_id) key, the key of the last job on the
+                previous page.
+            limit: The maximum number of jobs to return.
+
+        Returns:
+            A list of jobs.
+        """
+        if order_by not in ORDER_BY_FIELDS:
+            msg = f"Can not order jobs by {order_by}"
+            raise ValueError(msg)
+
+        def sort_key(job: Job) -> tuple[float, str]:
+            return (getattr(job, order_by), job.job_id)
+
+        jobs = self.list_jobs(states_in=states_in, states_not_in=states_not_in)
+        if after is not None:
+            jobs = [job for job in jobs if sort_key(job) > after]
+        if limit is None:
+            return sorted(jobs, key=sort_key)
+        return heapq.nsmallest(limit, jobs, key=sort_key)
+
     def get_job(self, job_id: str) -> Job | None:
+        if self._shared and job_id not in self._jobs:
+            # The Job may have been created by another process.
+            self.sync()
         return self._jobs.get(job_id)
 
+    def load_changes(self) -> tuple[int, list[dict], list[str]]:
+        """Load the changes made to the shared store since the last sync, can be called from a thread."""
+        if self._shared_store is None:
+            return self._revision, [], []
+        return self._shared_store.load_changes(self._revision)
+
+    def apply_changes(self, changes: tuple[int, list[dict], list[str]]):
+        """Bring the registry up to date with changes loaded with load_changes."""
+        revision, records, deleted = changes
+        for record in records:
+            job = self._jobs.get(record["job_id"])
+            if job is None:
+                job = self.new_job(record["job_id"])
+                job.load_record(record)
+                self.add_job(job)
+                self.update_part_job_relation(job)
+            else:
+                job.load_record(record)
+        for job_id in deleted:
+            if job_id in self._jobs:
+                self._remove_job(job_id)
+                self._dirty.pop(job_id, None)
+                self.spec_cache.invalidate(job_id)
+        self._revision = max(self._revision, revision)
+
+    def sync(self):
+        """Bring the registry up to date with the changes other processes made to the shared store."""
+        if self._shared:
+            self.apply_changes(self.load_changes())
+
+    def _reload_job(self, job_id: str):
+        """Load a Job in the registry from the store again."""
+        try:
+            record = self._store.load_record(job_id)
+        except FileNotFoundError:
+            self._remove_job(job_id)
+        else:
+            self._jobs[job_id].load_record(record)
+
     def delete_job(self, job_id: str):
         """Delete a Job.
 
         Will delete a job even if it is not in the registry.
         Does not error if a job delete is requested for a job that does not exist.
+        The parts of the Jobs that still wait for the deleted Job are submitted again.
 
         Args:
             name: The name/id of the Job.
@@ -297,34 +1269,111 @@ class JobManager:
             job = self.get_job(job_id)
             if job:
                 job.delete()
-            del self._jobs[job_id]
+            self._remove_job(job_id)
+            self._dirty.pop(job_id, None)
         else:
-            job = Job(job_id=job_id, jobs_path=self._jobs_path)
+            job = self.new_job(job_id)
             job.delete()
+        # The Jobs waiting for the deleted Job would wait forever, they get a new Job for their part.
+        for dependent in self.list_waiting_dependents(job_id):
+            self.recreate_dependencies(dependent)
 
-    def job_from_spec(self, spec: dict) -> Job:
-        """Create a new Job from a Part Specification."""
-        # We only use the features to determine the JOB ID.
-        sha1hash = hashlib.sha1()  # noqa: S324
-        features_spec = spec.get("features", [])
-        sha1hash.update(json.dumps(features_spec).encode())
-        parts_spec = spec.get("parts", [])
-        sha1hash.update(json.dumps(parts_spec).encode())
-        job_id = sha1hash.hexdigest()
+    def submit_parts(self, spec: dict, *, priority: int = 0, submitter: str | None = None) -> list[str]:
+        """Submit the parts of an assembly that are Part Specifications themselves, see submit_spec.
 
-        if job_id in self._jobs:
+        Returns:
+            The IDs of the Jobs of the parts, the Jobs the assembly depends on.
+        """
+        depends_on = []
+        for part_spec in spec.get("parts", []) or []:
+            if part_spec.get("name") and (part_spec.get("features") or part_spec.get("parts")):
+                sub_spec = {key: part_spec.get(key) for key in ("name", "features", "parts")}
+                part_job = self.job_from_spec(sub_spec, priority=priority, submitter=submitter)
+                if part_job.job_id not in depends_on:
+                    depends_on.append(part_job.job_id)
+        return depends_on
+
+    def list_waiting_dependents(self, job_id: str) -> list[Job]:
+        """List the Jobs that depend on a Job and are not completed yet."""
+        return [job for job in self._dependents.get(job_id, {}).values() if job.state != JobState.COMPLETED]
+
+    def recreate_dependencies(self, job: Job, spec: dict | None = None):
+        """Submit the parts of a Job again, the Jobs of parts it waits for may have been deleted.
+
+        Args:
+            job: The Job.
+            spec: The Part Specification of the Job, loaded from the store when None.
+        """
+        if spec is None:
+            try:
+                spec = job.get_spec()
+            except FileNotFoundError:
+                logging.warning("Can not recreate the parts of job %s without its spec", job.job_id)
+                return
+        depends_on = self.submit_parts(spec, priority=job.priority, submitter=job.submitter)
+        if depends_on != job.depends_on:
+            # The parts were submitted under another Job ID scheme before.
+            for dependency_id in job.depends_on:
+                self._dependents.get(dependency_id, {}).pop(job.job_id, None)
+            job.depends_on = depends_on
+            for dependency_id in depends_on:
+                self._dependents.setdefault(dependency_id, {})[job.job_id] = job
+            job.save_state()
+        self.release_waiting_tasks(job)
+
+    def job_from_spec(self, spec: dict, *, priority: int = 0, submitter: str | None = None) -> Job:
+        """Create a new Job from a Part Specification, see submit_spec."""
+        job, _existing = self.submit_spec(spec, priority=priority, submitter=submitter)
+        return job
+
+    def submit_spec(self, spec: dict, *, priority: int = 0, submitter: str | None = None) -> tuple[Job, bool]:
+        """Create a new Job from a Part Specification or find the existing Job for the same specification.
+
+        The parts of an assembly that are Part Specifications themselves, they have a name and features or parts,
+        get their own Job. A part that was submitted before reuses the existing Job and its artifacts. The tasks of
+        the assembly wait until the Jobs of its parts are completed. The parts of an existing Job are only submitted
+        again while it is not completed.
+
+        Args:
+            spec: The Part Specification.
+            priority: The priority of the Job, the parts get the same priority. Submitting an existing Job with a
+                higher priority raises the priority of the Job.
+            submitter: Who submitted the Job, the tasks are shared fairly between the submitters.
+
+        Returns:
+            The Job and whether the Job existed already.
+        """
+        # We only use the features and parts to determine the JOB ID.
+        job_id = job_id_from_spec(spec, self._settings.job_id_scheme)
+        if job_id not in self._jobs and self._spec_batch is None:
+            # Another process may have created the Job.
+            self.sync()
+        if job_id not in self._jobs:
+            # The same spec may have been submitted under the default scheme or before the IDs were canonical.
+            for old_job_id in previous_job_ids(spec, self._settings.job_id_scheme):
+                if old_job_id in self._jobs:
+                    job_id = old_job_id
+                    break
+
+        existing = job_id in self._jobs
+        if existing:
+            metrics.job_dedup_hits.inc()
             job = self._jobs[job_id]
+            if priority > job.priority:
+                job.set_priority(priority)
+            if job.state != JobState.COMPLETED:
+                # The Jobs of its parts may have been pruned, a completed Job does not need them again.
+                self.recreate_dependencies(job, spec)
         else:
-            job = Job(job_id=job_id, jobs_path=self._jobs_path)
+            job = self.new_job(job_id)
+            job.depends_on = self.submit_parts(spec, priority=priority, submitter=submitter)
+            job.priority = priority
+            job.submitter = submitter
             job.save_spec(spec)
-            if features_spec:
-                # TODO: Replace hardcoded freecad with config driven.
-                job.set_task_state("freecad", TaskState.CREATED)  # For now: Give every parts job a FreeCAD task.
-                job.feature_count = len(features_spec)
-            if parts_spec:
-                # TODO: Replace hardcoded blender with config driven.
-                job.set_task_state("blender", TaskState.CREATED)  # For now: Give every assembly job a Blender task.
-                job.part_count = len(parts_spec)
-            self._jobs[job_id] = job
+            # Add the Job before its tasks, a state that could not be written is then written again.
+            self.add_job(job)
             self.update_part_job_relation(job)
-        return job
+            task_names = self.pipeline_tasks(spec)
+            for task_name in task_names:
+                job.set_task_state(task_name, self.initial_task_state(job, task_name, task_names))
+        return job, existing
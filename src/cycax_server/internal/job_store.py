@@ -0,0 +1,839 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Backends that persist the Job specifications and states.
+
+A job record is the dictionary the registry is rebuilt from at startup, it holds everything about a Job except the
+specification itself:
+
+    {
+        "job_id": str,
+        "part_name": str | None,
+        "feature_count": int,
+        "part_count": int,
+        "created_at": float,
+        "last_updated": float,
+        "state": {
+            "job": str,
+            "state_changed_at": float,
+            "tasks": {task_name: task_state},
+            "depends_on": [job_id],
+            "priority": int,
+            "submitter": str,
+            "task_times": {task_name: {task_state: float}},
+            "leases": {task_name: float},
+            "lease_tokens": {task_name: str},
+        },
+        "artifacts": {artifact_name: {"size": int, "sha256": str, "mtime": float}},
+    }
+
+The depends_on list is only in the state of an assembly with parts that have their own Job, the state_changed_at,
+priority, submitter, task_times, leases and lease_tokens are left out when they are not set. The task_times are the
+times each task last entered each state, the leases the times the leases on the TAKEN and RUNNING tasks expire and the
+lease_tokens the tokens the leases were handed out with. The artifacts are the artifact manifest of the Job, the size,
+sha256 and mtime are None for artifact files that are not in the manifest yet.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from cycax_server.internal.settings import Settings
+
+# Filenames
+PART_FN = "part.json"
+STATE_FN = "state.json"
+ARTIFACTS_FN = "artifacts.json"
+# The files in a Job directory that are not artifacts.
+METADATA_FILENAMES = (PART_FN, STATE_FN, ARTIFACTS_FN)
+SQLITE_FN = "jobs.sqlite"
+SNAPSHOT_FN = "jobs.snapshot.json"
+SNAPSHOT_VERSION = 2
+# The columns added to the SQLite tables after they were first released, table, name and definition.
+MIGRATION_COLUMNS = (
+    ("jobs", "priority", "INTEGER NOT NULL DEFAULT 0"),
+    ("jobs", "submitter", "TEXT"),
+    ("jobs", "rev", "INTEGER NOT NULL DEFAULT 0"),
+    ("jobs", "state_changed_at", "REAL"),
+    ("tasks", "times", "TEXT"),
+    ("tasks", "lease_expires_at", "REAL"),
+    ("tasks", "lease_token", "TEXT"),
+)
+# Tombstones of deleted Jobs are kept this long for the other processes sharing the store to see the delete.
+TOMBSTONE_SECONDS = 24 * 60 * 60
+
+
+def write_atomic(path: Path, text: str):
+    """Write a file so readers see either the old or the new contents, never a partial file."""
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, prefix=f".{path.name}.", delete=False) as fp:
+        fp.write(text)
+    os.replace(fp.name, path)
+
+
+def spec_summary(spec: dict) -> dict:
+    """The parts of a job record that are derived from the specification."""
+    return {
+        "part_name": spec.get("name"),
+        "feature_count": len(spec.get("features") or []),
+        "part_count": len(spec.get("parts") or []),
+    }
+
+
+class JobStore(ABC):
+    """Base class for the job storage backends, see SharedJobStore for the stores several processes can share."""
+
+    def load_spec(self, job_id: str) -> dict:
+        """Load the Part Spec of a Job."""
+        return json.loads(self.load_spec_json(job_id))
+
+    @abstractmethod
+    def load_spec_json(self, job_id: str) -> bytes:
+        """Load the Part Spec of a Job as JSON."""
+
+    @abstractmethod
+    def save_spec(self, job_id: str, spec: dict):
+        """Save the Part Spec of a Job."""
+
+    def save_specs(self, specs: dict[str, dict]):
+        """Save the Part Specs of many Jobs, a mapping of job_id to spec."""
+        for job_id, spec in specs.items():
+            self.save_spec(job_id, spec)
+
+    @abstractmethod
+    def load_state(self, job_id: str) -> dict:
+        """Load the state of a Job, an empty dictionary when the state was never saved."""
+
+    @abstractmethod
+    def save_state(self, job_id: str, state: dict):
+        """Save the state of a Job."""
+
+    def save_states(self, states: dict[str, dict]):
+        """Save the states of many Jobs, a mapping of job_id to state."""
+        for job_id, state in states.items():
+            self.save_state(job_id, state)
+
+    @abstractmethod
+    def save_artifacts(self, job_id: str, artifacts: dict[str, dict]):
+        """Save the artifact manifest of a Job, a mapping of artifact name to size, sha256 and mtime."""
+
+    @abstractmethod
+    def get_mtime(self, job_id: str) -> float:
+        """Get the time the Job was last modified."""
+
+    @abstractmethod
+    def load_record(self, job_id: str) -> dict:
+        """Load the job record of a single Job."""
+
+    @abstractmethod
+    def load_records(self) -> Iterator[dict]:
+        """Load the job records of all the Jobs in the store."""
+
+    @abstractmethod
+    def delete(self, job_id: str):
+        """Remove a Job from the store, does not error if the Job does not exist."""
+
+    def checkpoint(self):
+        """Persist anything that makes the next startup faster."""
+
+    def close(self):
+        """Release the resources held by the store."""
+
+
+class SharedJobStore(JobStore):
+    """Base class for the job stores several server processes can share, see the shared_store setting.
+
+    The tasks are taken and the leases expired in a single atomic step, the states are written with a compare-and-set
+    and every process loads the changes made by the others.
+    """
+
+    @abstractmethod
+    def take_task(
+        self, job_id: str, task_name: str, *, max_active: int | None = None, lease_token: str | None = None
+    ) -> bool:
+        """Set a CREATED task to TAKEN in a single atomic step.
+
+        Args:
+            job_id: The ID of the Job.
+            task_name: The name of the task.
+            max_active: The maximum number of TAKEN and RUNNING tasks of the type, see the task_concurrency setting.
+            lease_token: The token the lease on the task is handed out with.
+
+        Returns:
+            False when the task is not CREATED, another process sharing the store took it first, or when max_active
+            tasks of the type are TAKEN or RUNNING.
+        """
+
+    @abstractmethod
+    def expire_lease(self, job_id: str, task_name: str, now: float) -> bool:
+        """Set a TAKEN or RUNNING task whose lease expired before now to CREATED in a single atomic step.
+
+        Returns:
+            False when the task is not leased, the lease was renewed or the task finished through another process.
+        """
+
+    @abstractmethod
+    def compare_and_save_states(self, states: dict[str, dict], expected_tasks: dict[str, dict]) -> list[str]:
+        """Save the states of many Jobs, each only when its tasks are still in the states the writer expects.
+
+        A task may also already be in the state it is written with. The state of a Job with a task in any other state
+        is not written at all, another process changed the Job.
+
+        Args:
+            states: The job_id to the state, see save_states.
+            expected_tasks: The job_id to the task name to the task state expected in the store, None for a task
+                that is not in the store yet.
+
+        Returns:
+            The IDs of the Jobs whose state was not written.
+        """
+
+    @abstractmethod
+    def get_revision(self) -> int:
+        """The revision of the store, it increases with every change."""
+
+    @abstractmethod
+    def load_changes(self, revision: int) -> tuple[int, list[dict], list[str]]:
+        """Load what changed since a revision, also the changes made by other processes sharing the store.
+
+        Returns:
+            The current revision, the job records of the Jobs that changed and the IDs of the deleted Jobs.
+        """
+
+
+class FileJobStore(JobStore):
+    """Store each Job as a part.json and state.json file in the Job directory.
+
+    With a snapshot_path the job records are also kept in a snapshot file. At startup a Job's record is taken from the
+    snapshot when the modification time of the Job directory has not changed, only the Jobs that changed since the
+    snapshot was written are read from their directories.
+    """
+
+    def __init__(self, jobs_path: Path, snapshot_path: Path | None = None):
+        self._jobs_path = jobs_path
+        self._snapshot_path = snapshot_path
+        # The job records as they are on disk, written to the snapshot on checkpoint.
+        self._records: dict[str, dict] = {}
+        self._records_lock = threading.Lock()
+
+    def _update_record(self, job_id: str, **values):
+        """Update the known record of a Job after a write, the directory mtime changes with every write."""
+        if self._snapshot_path is None:
+            return
+        mtime = self.get_mtime(job_id)
+        with self._records_lock:
+            record = self._records.get(job_id)
+            if record is None:
+                return
+            record.update(values)
+            record["last_updated"] = mtime
+
+    def load_spec_json(self, job_id: str) -> bytes:
+        return (self._jobs_path / job_id / PART_FN).read_bytes()
+
+    def save_spec(self, job_id: str, spec: dict):
+        job_path = self._jobs_path / job_id
+        job_path.mkdir(exist_ok=True, parents=True)
+        write_atomic(job_path / PART_FN, json.dumps(spec))
+        if self._snapshot_path is not None:
+            # Build the record from the spec, reading the Job back from disk would slow down submitting Jobs.
+            mtime = job_path.stat().st_mtime
+            with self._records_lock:
+                record = self._records.get(job_id)
+                if record is None:
+                    created_at = (job_path / PART_FN).stat().st_mtime
+                    record = {"job_id": job_id, "created_at": created_at, "state": {}, "artifacts": {}}
+                    self._records[job_id] = record
+                record.update(spec_summary(spec))
+                record["last_updated"] = mtime
+
+    def load_state(self, job_id: str) -> dict:
+        state_path = self._jobs_path / job_id / STATE_FN
+        if state_path.exists():
+            return json.loads(state_path.read_text())
+        return {}
+
+    def save_state(self, job_id: str, state: dict):
+        write_atomic(self._jobs_path / job_id / STATE_FN, json.dumps(state))
+        self._update_record(job_id, state=state)
+
+    def save_artifacts(self, job_id: str, artifacts: dict[str, dict]):
+        write_atomic(self._jobs_path / job_id / ARTIFACTS_FN, json.dumps(artifacts))
+        self._update_record(job_id, artifacts=artifacts)
+
+    def get_mtime(self, job_id: str) -> float:
+        return (self._jobs_path / job_id).stat().st_mtime
+
+    def load_record(self, job_id: str) -> dict:
+        job_path = self._jobs_path / job_id
+        record = spec_summary(self.load_spec(job_id))
+        record["job_id"] = job_id
+        record["created_at"] = (job_path / PART_FN).stat().st_mtime
+        record["last_updated"] = job_path.stat().st_mtime
+        record["state"] = self.load_state(job_id)
+        manifest_path = job_path / ARTIFACTS_FN
+        manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+        # Only the artifacts that are on disk, artifacts saved before there was a manifest have no info.
+        no_info = {"size": None, "sha256": None, "mtime": None}
+        record["artifacts"] = {
+            path.name: manifest.get(path.name, no_info)
+            for path in job_path.iterdir()
+            if path.name not in METADATA_FILENAMES and path.name[0] != "."
+        }
+        return record
+
+    def load_records(self) -> Iterator[dict]:
+        if not self._jobs_path.exists():
+            return
+        snapshot = self.read_snapshot()
+        records = {}
+        reused = 0
+        with os.scandir(self._jobs_path) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                record = snapshot.get(entry.name)
+                if record is not None and record["last_updated"] == entry.stat().st_mtime:
+                    reused += 1
+                elif (Path(entry.path) / PART_FN).exists():
+                    record = self.load_record(entry.name)
+                else:
+                    continue
+                records[entry.name] = record
+                yield record
+        if self._snapshot_path is not None:
+            logging.warning("Loaded %s jobs, %s from the snapshot", len(records), reused)
+            with self._records_lock:
+                self._records = records
+
+    def read_snapshot(self) -> dict[str, dict]:
+        """Read the job records from the snapshot, empty when there is no usable snapshot."""
+        if self._snapshot_path is None or not self._snapshot_path.exists():
+            return {}
+        try:
+            snapshot = json.loads(self._snapshot_path.read_text())
+        except ValueError:
+            logging.warning("The snapshot %s is corrupt, ignoring it.", self._snapshot_path)
+            return {}
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logging.warning("The snapshot %s is from a different version, ignoring it.", self._snapshot_path)
+            return {}
+        return snapshot["jobs"]
+
+    def checkpoint(self):
+        """Write the job records to the snapshot."""
+        if self._snapshot_path is None:
+            return
+        with self._records_lock:
+            snapshot = {"version": SNAPSHOT_VERSION, "jobs": self._records}
+            text = json.dumps(snapshot)
+        write_atomic(self._snapshot_path, text)
+
+    def delete(self, job_id: str):
+        job_path = self._jobs_path / job_id
+        for filename in METADATA_FILENAMES:
+            (job_path / filename).unlink(missing_ok=True)
+        with self._records_lock:
+            self._records.pop(job_id, None)
+
+
+class SqliteJobStore(SharedJobStore):
+    """Store the Jobs in an SQLite database.
+
+    The database runs in WAL mode so readers do not block the writer, the Job and task states have their own
+    indexed columns. When the database is created the Jobs in the file layout are imported.
+    """
+
+    def __init__(self, db_path: Path, jobs_path: Path):
+        self._db_path = db_path
+        self._jobs_path = jobs_path
+        self._lock = threading.RLock()
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._db_path.parent.mkdir(exist_ok=True, parents=True)
+            is_new = not self._db_path.exists()
+            connection = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    part_name TEXT,
+                    feature_count INTEGER NOT NULL DEFAULT 0,
+                    part_count INTEGER NOT NULL DEFAULT 0,
+                    spec TEXT NOT NULL,
+                    job_state TEXT NOT NULL DEFAULT 'CREATED',
+                    state_changed_at REAL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    submitter TEXT,
+                    rev INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_job_state ON jobs (job_state);
+                CREATE TABLE IF NOT EXISTS tasks (
+                    job_id TEXT NOT NULL REFERENCES jobs (job_id) ON DELETE CASCADE,
+                    name TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    times TEXT,
+                    lease_expires_at REAL,
+                    lease_token TEXT,
+                    PRIMARY KEY (job_id, name)
+                );
+                CREATE INDEX IF NOT EXISTS tasks_name_state ON tasks (name, state);
+                CREATE TABLE IF NOT EXISTS dependencies (
+                    job_id TEXT NOT NULL REFERENCES jobs (job_id) ON DELETE CASCADE,
+                    depends_on TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (job_id, depends_on)
+                );
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    job_id TEXT NOT NULL REFERENCES jobs (job_id) ON DELETE CASCADE,
+                    name TEXT NOT NULL,
+                    size INTEGER,
+                    sha256 TEXT,
+                    mtime REAL,
+                    PRIMARY KEY (job_id, name)
+                );
+                CREATE TABLE IF NOT EXISTS deleted_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    rev INTEGER NOT NULL,
+                    deleted_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS revision (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    rev INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO revision (id, rev) VALUES (0, 0);
+                """
+            )
+            self.migrate(connection)
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._connection = connection
+            if is_new:
+                self.import_jobs(FileJobStore(self._jobs_path))
+        return self._connection
+
+    def migrate(self, connection: sqlite3.Connection):
+        """Add the columns that are missing from a database created by an older version."""
+        columns: dict[str, set[str]] = {}
+        for table, name, definition in MIGRATION_COLUMNS:
+            if table not in columns:
+                columns[table] = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if name not in columns[table]:
+                logging.warning("Adding column %s.%s to %s", table, name, self._db_path)
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_rev ON jobs (rev)")
+
+    def import_jobs(self, store: JobStore):
+        """Copy all the Jobs from another store into this one."""
+        count = 0
+        for record in store.load_records():
+            job_id = record["job_id"]
+            self.save_spec(job_id, store.load_spec(job_id), created_at=record["created_at"])
+            self.save_state(job_id, record["state"])
+            self.save_artifacts(job_id, record["artifacts"])
+            count += 1
+        if count:
+            logging.warning("Imported %s jobs into %s", count, self._db_path)
+
+    def load_spec_json(self, job_id: str) -> bytes:
+        with self._lock:
+            row = self.connection.execute("SELECT spec FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(job_id)
+        return row[0].encode()
+
+    def save_spec(self, job_id: str, spec: dict, created_at: float | None = None):
+        self.save_specs({job_id: spec}, created_at=created_at)
+
+    def save_specs(self, specs: dict[str, dict], created_at: float | None = None):
+        if not specs:
+            return
+        now = time.time()
+        rows = []
+        for job_id, spec in specs.items():
+            summary = spec_summary(spec)
+            rows.append(
+                (
+                    job_id,
+                    summary["part_name"],
+                    summary["feature_count"],
+                    summary["part_count"],
+                    json.dumps(spec),
+                    now if created_at is None else created_at,
+                    now,
+                )
+            )
+        with self.transaction() as connection:
+            rev = self._next_revision(connection)
+            connection.executemany("DELETE FROM deleted_jobs WHERE job_id = ?", [(job_id,) for job_id in specs])
+            connection.executemany(
+                """
+                INSERT INTO jobs (job_id, part_name, feature_count, part_count, spec, created_at, updated_at, rev)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    part_name = excluded.part_name,
+                    feature_count = excluded.feature_count,
+                    part_count = excluded.part_count,
+                    spec = excluded.spec,
+                    rev = excluded.rev,
+                    updated_at = excluded.updated_at
+                """,
+                [(*row, rev) for row in rows],
+            )
+
+    def load_state(self, job_id: str) -> dict:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT job_state, priority, submitter, state_changed_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return {}
+            task_rows = self.connection.execute(
+                "SELECT name, state, times, lease_expires_at, lease_token FROM tasks WHERE job_id = ?", (job_id,)
+            ).fetchall()
+            dependencies = self.connection.execute(
+                "SELECT depends_on FROM dependencies WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        tasks = {name: task_state for name, task_state, _, _, _ in task_rows}
+        task_times = {name: json.loads(times) for name, _, times, _, _ in task_rows if times}
+        leases = {name: expires_at for name, _, _, expires_at, _ in task_rows if expires_at is not None}
+        lease_tokens = {name: token for name, _, _, _, token in task_rows if token is not None}
+        return self._state(
+            row[0],
+            tasks,
+            depends_on=[dependency_id for (dependency_id,) in dependencies],
+            priority=row[1],
+            submitter=row[2],
+            task_times=task_times,
+            leases=leases,
+            lease_tokens=lease_tokens,
+            state_changed_at=row[3],
+        )
+
+    @staticmethod
+    def _state(
+        job_state: str,
+        tasks: dict,
+        *,
+        depends_on: list[str],
+        priority: int,
+        submitter: str | None,
+        task_times: dict[str, dict[str, float]],
+        leases: dict[str, float],
+        lease_tokens: dict[str, str],
+        state_changed_at: float | None,
+    ) -> dict:
+        """Create a state dictionary, the optional values are left out when they are not set."""
+        state = {"job": job_state, "tasks": tasks}
+        if state_changed_at is not None:
+            state["state_changed_at"] = state_changed_at
+        if depends_on:
+            state["depends_on"] = depends_on
+        if priority:
+            state["priority"] = priority
+        if submitter is not None:
+            state["submitter"] = submitter
+        if task_times:
+            state["task_times"] = task_times
+        if leases:
+            state["leases"] = leases
+        if lease_tokens:
+            state["lease_tokens"] = lease_tokens
+        return state
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the statements in the with block in a single transaction."""
+        with self._lock:
+            connection = self.connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def _next_revision(self, connection: sqlite3.Connection) -> int:
+        """Increase the revision of the store, call it in a transaction and tag the changed rows with the result."""
+        return connection.execute("UPDATE revision SET rev = rev + 1 RETURNING rev").fetchone()[0]
+
+    def get_revision(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT rev FROM revision").fetchone()[0]
+
+    def save_state(self, job_id: str, state: dict):
+        self.save_states({job_id: state})
+
+    def save_states(self, states: dict[str, dict]):
+        """Save the states of many Jobs.
+
+        Only the tasks in the states are written, the other tasks of the Jobs keep the state they have in the store.
+        """
+        with self.transaction() as connection:
+            self._save_states(connection, states)
+
+    def compare_and_save_states(self, states: dict[str, dict], expected_tasks: dict[str, dict]) -> list[str]:
+        conflicts = []
+        with self.transaction() as connection:
+            for job_id, expected in expected_tasks.items():
+                stored = dict(connection.execute("SELECT name, state FROM tasks WHERE job_id = ?", (job_id,)))
+                tasks = states[job_id].get("tasks", {})
+                if any(stored.get(name) not in (task_state, tasks.get(name)) for name, task_state in expected.items()):
+                    conflicts.append(job_id)
+                elif not expected:
+                    # No task changed here, the Job state derived from the tasks may be out of date, e.g. a heartbeat.
+                    states[job_id] = {
+                        key: value for key, value in states[job_id].items() if key not in ("job", "state_changed_at")
+                    }
+            self._save_states(
+                connection, {job_id: state for job_id, state in states.items() if job_id not in conflicts}
+            )
+        return conflicts
+
+    def _save_states(self, connection: sqlite3.Connection, states: dict[str, dict]):
+        """Save the states of many Jobs in the transaction of the connection."""
+        if not states:
+            return
+        now = time.time()
+        rev = self._next_revision(connection)
+        for job_id, state in states.items():
+            cursor = connection.execute(
+                "UPDATE jobs SET job_state = COALESCE(?, job_state), state_changed_at = COALESCE(?, state_changed_at), "
+                "priority = ?, submitter = ?, rev = ?, updated_at = ? WHERE job_id = ?",
+                (
+                    state.get("job"),
+                    state.get("state_changed_at"),
+                    state.get("priority", 0),
+                    state.get("submitter"),
+                    rev,
+                    now,
+                    job_id,
+                ),
+            )
+            if cursor.rowcount == 0:
+                # The Job was deleted.
+                continue
+            task_times = state.get("task_times", {})
+            tasks = state.get("tasks", {})
+            leases = state.get("leases", {})
+            lease_tokens = state.get("lease_tokens", {})
+            # A lease is never shortened while the task stays handed out, a heartbeat may have gone to another process.
+            connection.executemany(
+                """
+                INSERT INTO tasks (job_id, name, state, times, lease_expires_at, lease_token) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id, name) DO UPDATE SET
+                    state = excluded.state,
+                    times = excluded.times,
+                    lease_token = excluded.lease_token,
+                    lease_expires_at = CASE
+                        WHEN tasks.state IN ('TAKEN', 'RUNNING') AND excluded.state IN ('TAKEN', 'RUNNING')
+                        THEN max(
+                            COALESCE(tasks.lease_expires_at, excluded.lease_expires_at),
+                            COALESCE(excluded.lease_expires_at, tasks.lease_expires_at)
+                        )
+                        ELSE excluded.lease_expires_at
+                    END
+                """,
+                [
+                    (
+                        job_id,
+                        name,
+                        task_state,
+                        json.dumps(task_times[name]) if name in task_times else None,
+                        leases.get(name),
+                        lease_tokens.get(name),
+                    )
+                    for name, task_state in tasks.items()
+                ],
+            )
+            # The leases renewed on tasks that did not change.
+            connection.executemany(
+                "UPDATE tasks SET lease_expires_at = max(COALESCE(lease_expires_at, ?), ?) "
+                "WHERE job_id = ? AND name = ? AND state IN ('TAKEN', 'RUNNING')",
+                [(expires_at, expires_at, job_id, name) for name, expires_at in leases.items() if name not in tasks],
+            )
+            connection.execute("DELETE FROM dependencies WHERE job_id = ?", (job_id,))
+            connection.executemany(
+                "INSERT INTO dependencies (job_id, depends_on, position) VALUES (?, ?, ?)",
+                [
+                    (job_id, dependency_id, position)
+                    for position, dependency_id in enumerate(state.get("depends_on", []))
+                ],
+            )
+
+    def save_artifacts(self, job_id: str, artifacts: dict[str, dict]):
+        with self.transaction() as connection:
+            connection.execute("UPDATE jobs SET rev = ? WHERE job_id = ?", (self._next_revision(connection), job_id))
+            connection.execute("DELETE FROM artifacts WHERE job_id = ?", (job_id,))
+            connection.executemany(
+                "INSERT INTO artifacts (job_id, name, size, sha256, mtime) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, name, info["size"], info["sha256"], info["mtime"]) for name, info in artifacts.items()],
+            )
+
+    def get_mtime(self, job_id: str) -> float:
+        with self._lock:
+            row = self.connection.execute("SELECT updated_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(job_id)
+        return row[0]
+
+    def _select_records(self, where: str = "", params: tuple = ()) -> Iterator[dict]:
+        with self._lock:
+            # The where clause is never user input, the values are always passed as parameters.
+            job_query = f"SELECT job_id, part_name, feature_count, part_count, job_state, state_changed_at, priority, submitter, created_at, updated_at FROM jobs {where}"  # noqa: E501, S608
+            task_query = f"SELECT job_id, name, state, times, lease_expires_at, lease_token FROM tasks WHERE job_id IN (SELECT job_id FROM jobs {where})"  # noqa: E501, S608
+            artifact_query = f"SELECT job_id, name, size, sha256, mtime FROM artifacts WHERE job_id IN (SELECT job_id FROM jobs {where})"  # noqa: E501, S608
+            dependency_query = f"SELECT job_id, depends_on FROM dependencies WHERE job_id IN (SELECT job_id FROM jobs {where}) ORDER BY job_id, position"  # noqa: E501, S608
+            rows = self.connection.execute(job_query, params).fetchall()
+            task_rows = self.connection.execute(task_query, params).fetchall()
+            artifact_rows = self.connection.execute(artifact_query, params).fetchall()
+            dependency_rows = self.connection.execute(dependency_query, params).fetchall()
+        tasks: dict[str, dict[str, str]] = {}
+        task_times: dict[str, dict[str, dict[str, float]]] = {}
+        leases: dict[str, dict[str, float]] = {}
+        lease_tokens: dict[str, dict[str, str]] = {}
+        for job_id, name, task_state, times, lease_expires_at, lease_token in task_rows:
+            tasks.setdefault(job_id, {})[name] = task_state
+            if times:
+                task_times.setdefault(job_id, {})[name] = json.loads(times)
+            if lease_expires_at is not None:
+                leases.setdefault(job_id, {})[name] = lease_expires_at
+            if lease_token is not None:
+                lease_tokens.setdefault(job_id, {})[name] = lease_token
+        artifacts: dict[str, dict[str, dict]] = {}
+        for job_id, name, size, sha256, mtime in artifact_rows:
+            artifacts.setdefault(job_id, {})[name] = {"size": size, "sha256": sha256, "mtime": mtime}
+        dependencies: dict[str, list[str]] = {}
+        for job_id, dependency_id in dependency_rows:
+            dependencies.setdefault(job_id, []).append(dependency_id)
+        for (
+            job_id,
+            part_name,
+            feature_count,
+            part_count,
+            job_state,
+            state_changed_at,
+            priority,
+            submitter,
+            created_at,
+            updated_at,
+        ) in rows:
+            state = self._state(
+                job_state,
+                tasks.get(job_id, {}),
+                depends_on=dependencies.get(job_id, []),
+                priority=priority,
+                submitter=submitter,
+                task_times=task_times.get(job_id, {}),
+                leases=leases.get(job_id, {}),
+                lease_tokens=lease_tokens.get(job_id, {}),
+                state_changed_at=state_changed_at,
+            )
+            yield {
+                "job_id": job_id,
+                "part_name": part_name,
+                "feature_count": feature_count,
+                "part_count": part_count,
+                "created_at": created_at,
+                "last_updated": updated_at,
+                "state": state,
+                "artifacts": artifacts.get(job_id, {}),
+            }
+
+    def load_record(self, job_id: str) -> dict:
+        for record in self._select_records("WHERE job_id = ?", (job_id,)):
+            return record
+        raise FileNotFoundError(job_id)
+
+    def load_records(self) -> Iterator[dict]:
+        yield from self._select_records()
+
+    def delete(self, job_id: str):
+        with self.transaction() as connection:
+            cursor = connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            if cursor.rowcount:
+                connection.execute(
+                    "INSERT OR REPLACE INTO deleted_jobs (job_id, rev, deleted_at) VALUES (?, ?, ?)",
+                    (job_id, self._next_revision(connection), time.time()),
+                )
+
+    def take_task(
+        self, job_id: str, task_name: str, *, max_active: int | None = None, lease_token: str | None = None
+    ) -> bool:
+        with self.transaction() as connection:
+            if max_active is not None:
+                (active,) = connection.execute(
+                    "SELECT count(*) FROM tasks WHERE name = ? AND state IN ('TAKEN', 'RUNNING')", (task_name,)
+                ).fetchone()
+                if active >= max_active:
+                    return False
+            cursor = connection.execute(
+                "UPDATE tasks SET state = 'TAKEN', lease_expires_at = NULL, lease_token = ? "
+                "WHERE job_id = ? AND name = ? AND state = 'CREATED'",
+                (lease_token, job_id, task_name),
+            )
+            if cursor.rowcount == 0:
+                return False
+            now = time.time()
+            connection.execute(
+                "UPDATE jobs SET state_changed_at = CASE WHEN job_state = 'RUNNING' THEN state_changed_at ELSE ? END, "
+                "job_state = 'RUNNING', rev = ?, updated_at = ? WHERE job_id = ?",
+                (now, self._next_revision(connection), now, job_id),
+            )
+        return True
+
+    def expire_lease(self, job_id: str, task_name: str, now: float) -> bool:
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET state = 'CREATED', lease_expires_at = NULL, lease_token = NULL "
+                "WHERE job_id = ? AND name = ? AND state IN ('TAKEN', 'RUNNING') AND lease_expires_at < ?",
+                (job_id, task_name, now),
+            )
+            if cursor.rowcount == 0:
+                return False
+            connection.execute(
+                "UPDATE jobs SET rev = ?, updated_at = ? WHERE job_id = ?",
+                (self._next_revision(connection), now, job_id),
+            )
+        return True
+
+    def load_changes(self, revision: int) -> tuple[int, list[dict], list[str]]:
+        with self._lock:
+            # Read the revision first, a change made while the records are read is loaded again next time.
+            current = self.get_revision()
+            records = list(self._select_records("WHERE rev > ?", (revision,)))
+            deleted = self.connection.execute("SELECT job_id FROM deleted_jobs WHERE rev > ?", (revision,)).fetchall()
+        return current, records, [job_id for (job_id,) in deleted]
+
+    def checkpoint(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM deleted_jobs WHERE deleted_at < ?", (time.time() - TOMBSTONE_SECONDS,))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def create_job_store(settings: Settings) -> JobStore:
+    """Create the job store selected in the settings."""
+    jobs_path = settings.var_dir / "jobs"
+    if settings.job_store == "sqlite":
+        return SqliteJobStore(settings.var_dir / SQLITE_FN, jobs_path)
+    return FileJobStore(jobs_path, snapshot_path=settings.var_dir / SNAPSHOT_FN)
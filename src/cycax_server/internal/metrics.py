@@ -0,0 +1,49 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""The Prometheus metrics of the CyCAx Server, exposed on /metrics.
+
+The metrics are updated as things happen, collecting them does not look at the jobs or the files.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets for the task wait and run times, from a second to a day.
+TASK_SECONDS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)
+
+spec_cache_hits = Counter("cycax_spec_cache_hits", "Number of Part Spec reads served from the spec cache.")
+spec_cache_misses = Counter("cycax_spec_cache_misses", "Number of Part Spec reads that had to go to the job store.")
+spec_cache_bytes = Gauge("cycax_spec_cache_bytes", "The size in bytes of the Part Specs in the spec cache.")
+
+jobs = Gauge("cycax_jobs", "Number of Jobs in the registry by Job state.", ["state"])
+tasks = Gauge("cycax_tasks", "Number of tasks in the registry by task name and state.", ["task", "state"])
+job_transitions = Counter("cycax_job_state_transitions", "Number of Job state changes.", ["from_state", "to_state"])
+task_transitions = Counter(
+    "cycax_task_state_transitions", "Number of task state changes by task name.", ["task", "from_state", "to_state"]
+)
+task_wait_seconds = Histogram(
+    "cycax_task_wait_seconds",
+    "Time a task was CREATED before a worker took it.",
+    ["task"],
+    buckets=TASK_SECONDS_BUCKETS,
+)
+task_run_seconds = Histogram(
+    "cycax_task_run_seconds",
+    "Time from a worker taking a task to the task being COMPLETED.",
+    ["task"],
+    buckets=TASK_SECONDS_BUCKETS,
+)
+job_dedup_hits = Counter("cycax_job_dedup_hits", "Number of submitted Part Specs that had a Job already.")
+
+artifact_bytes_received = Counter("cycax_artifact_bytes_received", "Number of artifact bytes uploaded.")
+artifact_bytes_sent = Counter("cycax_artifact_bytes_sent", "Number of artifact bytes downloaded, also in archives.")
+artifact_store_bytes = Gauge(
+    "cycax_artifact_store_bytes",
+    "The size in bytes of the artifact blob store, each artifact is stored once however many Jobs have it. Not the "
+    "size of the var_dir: the specs, states, job database and artifacts from before the blob store are not counted.",
+)
+
+background_task_seconds = Histogram(
+    "cycax_background_task_seconds", "Time a run of a background task, e.g. pruning, took.", ["task"]
+)
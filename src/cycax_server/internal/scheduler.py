@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""The order tasks are handed out to workers in, and the order the background tasks check Jobs in."""
+
+import heapq
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cycax_server.internal.job_manager import Job
+
+
+class TaskQueue:
+    """The jobs with a CREATED task of one type, in the order the tasks are handed out.
+
+    Jobs with a higher priority go first. Jobs with the same priority are shared fairly between the submitters: the
+    submitters take turns and each turn hands out the oldest task of the submitter. A submitter with thousands of
+    jobs in the queue does not hold up a submitter with a single job.
+    """
+
+    def __init__(self):
+        # Priority to share key to the jobs, the jobs and the share keys are in the order they are handed out.
+        self._levels: dict[int, dict[str, dict[str, Job]]] = {}
+        # The job_id to the priority and share key the Job was queued with.
+        self._queued: dict[str, tuple[int, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._queued
+
+    def add(self, job: "Job"):
+        """Add a Job to the back of its submitter's line, a Job that is already queued keeps its place."""
+        if job.job_id in self._queued:
+            return
+        priority, share_key = job.priority, job.share_key
+        self._queued[job.job_id] = (priority, share_key)
+        self._levels.setdefault(priority, {}).setdefault(share_key, {})[job.job_id] = job
+
+    def remove(self, job_id: str):
+        """Remove a Job from the queue, does nothing if the Job is not queued."""
+        queued = self._queued.pop(job_id, None)
+        if queued is None:
+            return
+        priority, share_key = queued
+        shares = self._levels[priority]
+        jobs = shares[share_key]
+        del jobs[job_id]
+        if not jobs:
+            del shares[share_key]
+            if not shares:
+                del self._levels[priority]
+
+    def next(self) -> "Job | None":
+        """The Job to hand out next, None when the queue is empty.
+
+        The submitter of the Job goes to the back of the line, the Job stays in the queue until it is removed.
+        """
+        if not self._levels:
+            return None
+        shares = self._levels[max(self._levels)]
+        share_key, jobs = next(iter(shares.items()))
+        shares[share_key] = shares.pop(share_key)
+        return next(iter(jobs.values()))
+
+
+class Deadlines:
+    """The Jobs that something is due for, by the time it is due, so the due Jobs are found without a scan.
+
+    Every Job is in at most once, with the earliest time it was scheduled for. A later deadline does not replace an
+    earlier one: when the earlier one comes up the caller checks the Job and schedules it again if nothing is due yet.
+    """
+
+    def __init__(self):
+        # The due time and job_id, the earliest first. Entries that do not match _scheduled are stale and skipped.
+        self._heap: list[tuple[float, str]] = []
+        # The job_id to the time the Job is scheduled for.
+        self._scheduled: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._scheduled)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._scheduled
+
+    def schedule(self, job_id: str, due: float):
+        """Schedule a Job, does nothing if the Job is already scheduled for the same time or earlier."""
+        scheduled = self._scheduled.get(job_id)
+        if scheduled is not None and scheduled <= due:
+            return
+        self._scheduled[job_id] = due
+        heapq.heappush(self._heap, (due, job_id))
+
+    def discard(self, job_id: str):
+        """Remove a Job, does nothing if the Job is not scheduled."""
+        self._scheduled.pop(job_id, None)
+
+    def take_due(self, now: float) -> list[str]:
+        """Take the IDs of the Jobs that are due at now out, the earliest first."""
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due, job_id = heapq.heappop(self._heap)
+            if self._scheduled.get(job_id) == due:
+                del self._scheduled[job_id]
+                due_ids.append(job_id)
+        return due_ids
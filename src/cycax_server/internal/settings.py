@@ -3,14 +3,71 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from pathlib import Path
+from typing import Literal
 
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class PipelineTask(BaseModel):
+    """A task every Job of a type gets."""
+
+    name: str
+    # The tasks of the same Job that must be COMPLETED before this task is handed out.
+    after: list[str] = []
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="CYCAX_")
 
     var_dir: Path = Path("/tmp/cycax_server/var")  # noqa: S108 - No security concern with placing files in temp.
+    job_store: Literal["file", "sqlite"] = "file"
+    # Share the job store with other server processes, e.g. uvicorn workers or replicas on the same volume.
+    shared_store: bool = False
+    store_sync_interval: float = 0.5
+    job_id_scheme: Literal["sha1", "blake2b"] = "sha1"
+    state_flush_interval: float = 0.5
+    spec_cache_bytes: int = 64 * 1024 * 1024
     freecad_enabled: bool = True
+    # The tasks a Job gets, by Job type: a "part" has features and an "assembly" has parts.
+    task_pipelines: dict[str, list[PipelineTask]] = {
+        "part": [PipelineTask(name="freecad")],
+        "assembly": [PipelineTask(name="blender")],
+    }
+    # The maximum number of tasks of a type that are TAKEN or RUNNING at the same time, by task name.
+    task_concurrency: dict[str, int] = {}
     keep_age_hours: int = 50
+    task_lease_seconds: int = 300
+    task_claim_max_wait: int = 60
+    # The number of recent durations per task type the latency statistics are computed from.
+    task_stats_window: int = 10000
     debug: bool = False
+
+    @model_validator(mode="after")
+    def check_shared_store(self) -> "Settings":
+        if self.shared_store and self.job_store != "sqlite":
+            msg = "A shared store needs the sqlite job store"
+            raise ValueError(msg)
+        return self
+
+    @model_validator(mode="after")
+    def check_task_pipelines(self) -> "Settings":
+        for job_type, pipeline in self.task_pipelines.items():
+            after = {task.name.lower(): [name.lower() for name in task.after] for task in pipeline}
+            for task_name, names in after.items():
+                unknown = [name for name in names if name not in after]
+                if unknown:
+                    msg = f"The {task_name} task of the {job_type} pipeline is after unknown tasks {unknown}"
+                    raise ValueError(msg)
+            # Remove the tasks that wait for nothing or only for removed tasks, what remains waits in a cycle.
+            remaining = dict(after)
+            while True:
+                ready = [name for name, names in remaining.items() if not set(names) & remaining.keys()]
+                if not ready:
+                    break
+                for name in ready:
+                    del remaining[name]
+            if remaining:
+                msg = f"The tasks {sorted(remaining)} of the {job_type} pipeline wait for each other"
+                raise ValueError(msg)
+        return self
@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import OrderedDict
+
+from cycax_server.internal import metrics
+
+
+class SpecCache:
+    """A least recently used cache of serialized Part Specs, bounded by their total size in bytes.
+
+    The specs are kept as the JSON bytes read from the store so a hit needs no parsing to be sent to a client.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._specs: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def get(self, job_id: str) -> bytes | None:
+        """Get the serialized spec of a Job, None when it is not in the cache."""
+        spec_json = self._specs.get(job_id)
+        if spec_json is None:
+            self.misses += 1
+            metrics.spec_cache_misses.inc()
+            return None
+        self._specs.move_to_end(job_id)
+        self.hits += 1
+        metrics.spec_cache_hits.inc()
+        return spec_json
+
+    def put(self, job_id: str, spec_json: bytes):
+        """Add the serialized spec of a Job, evicting the least recently used specs to make room."""
+        self.invalidate(job_id)
+        if len(spec_json) > self.max_bytes:
+            return
+        self._specs[job_id] = spec_json
+        self.size += len(spec_json)
+        while self.size > self.max_bytes:
+            _, evicted = self._specs.popitem(last=False)
+            self.size -= len(evicted)
+        metrics.spec_cache_bytes.set(self.size)
+
+    def invalidate(self, job_id: str):
+        """Remove the spec of a Job from the cache."""
+        spec_json = self._specs.pop(job_id, None)
+        if spec_json is not None:
+            self.size -= len(spec_json)
+            metrics.spec_cache_bytes.set(self.size)
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Latency statistics of the tasks: how long they wait in the queue and how long the workers take."""
+
+import math
+from collections import deque
+
+# The percentiles the statistics are summarized by.
+PERCENTILES = (50, 95, 99)
+# The kinds of durations kept for every task type.
+DURATION_KINDS = ("wait_seconds", "run_seconds")
+
+
+def percentile(ordered: list[float], percent: float) -> float:
+    """The nearest-rank percentile of a sorted, non-empty, list of values."""
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class TaskStats:
+    """The durations of the most recent tasks of each type.
+
+    Only the last `window` durations of each kind are kept per task type, the percentiles follow the current load and
+    the memory used does not grow with the number of Jobs.
+    """
+
+    def __init__(self, window: int):
+        self._window = window
+        # The task name and duration kind to the durations, oldest first.
+        self._durations: dict[tuple[str, str], deque[float]] = {}
+
+    def observe(self, task_name: str, kind: str, seconds: float):
+        """Add the duration of a task.
+
+        Args:
+            task_name: The name of the task.
+            kind: One of DURATION_KINDS.
+            seconds: The duration.
+        """
+        key = (task_name, kind)
+        if key not in self._durations:
+            self._durations[key] = deque(maxlen=self._window)
+        self._durations[key].append(seconds)
+
+    def task_names(self) -> list[str]:
+        """The names of the tasks there are durations for, sorted."""
+        return sorted({task_name for task_name, _ in self._durations})
+
+    def summary(self, task_name: str) -> dict[str, dict]:
+        """Summarize the durations of a task type.
+
+        Returns:
+            The count and the percentiles of every kind of duration, the percentiles are None without durations.
+        """
+        summary = {}
+        for kind in DURATION_KINDS:
+            ordered = sorted(self._durations.get((task_name, kind), ()))
+            summary[kind] = {"count": len(ordered)}
+            for percent in PERCENTILES:
+                summary[kind][f"p{percent}"] = percentile(ordered, percent) if ordered else None
+        return summary
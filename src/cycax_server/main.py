@@ -3,14 +3,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import asyncio
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from cycax_server.dependencies import get_job_manager, get_settings
-from cycax_server.internal.background import run_background_tasks
-from cycax_server.routers import jobs
+from cycax_server.internal.background import run_background_tasks, run_state_flusher, run_store_sync
+from cycax_server.routers import jobs, tasks
 
 
 @asynccontextmanager
@@ -26,10 +26,16 @@ async def lifespan(app: FastAPI):  # noqa: ARG001
     manager.update_from_disk()
     running = True
     bg_task = asyncio.create_task(run_background_tasks(running=running, manager=manager, settings=settings))
+    flush_task = asyncio.create_task(run_state_flusher(manager=manager, settings=settings))
+    sync_task = asyncio.create_task(run_store_sync(manager=manager, settings=settings))
     yield
     running = False
-    bg_task.cancel()
-    await bg_task
+    for task in (bg_task, flush_task, sync_task):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Write the state changes the flusher has not written yet.
+    manager.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -39,3 +45,4 @@ Instrumentator(app).instrument(app).expose(app, include_in_schema=False, should_
 instrumentator = Instrumentator().instrument(app)
 
 app.include_router(router=jobs.router)
+app.include_router(router=tasks.router)
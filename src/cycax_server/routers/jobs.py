@@ -2,51 +2,149 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import base64
+import binascii
+import json
 import logging
-import shutil
-from typing import Annotated
+import zipfile
+from datetime import UTC, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Form, HTTPException, Query, UploadFile
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 
 from cycax_server.dependencies import JobManager, get_job_manager
-from cycax_server.internal.job_manager import JobState
+from cycax_server.internal import metrics
+from cycax_server.internal.archive import stream_zip
+from cycax_server.internal.job_manager import (
+    Job,
+    JobState,
+    LeaseTokenError,
+    OrderByField,
+    StateConflictError,
+    task_durations,
+)
 
 router = APIRouter()
 
+ZIP_COMPRESSION = {"stored": zipfile.ZIP_STORED, "deflated": zipfile.ZIP_DEFLATED}
+
+
+class ArtifactResponse(FileResponse):
+    """A FileResponse that counts the artifact bytes it sends."""
+
+    async def __call__(self, scope, receive, send):
+        async def counting_send(message):
+            if message["type"] == "http.response.body":
+                metrics.artifact_bytes_sent.inc(len(message.get("body", b"")))
+            await send(message)
+
+        await super().__call__(scope, receive, counting_send)
+
 
 class PartSpec(BaseModel):
     name: str
     features: list[dict] | None = None
     parts: list[dict] | None = None
+    # How the Job is scheduled, these are not part of the specification that is saved.
+    # The stores keep the priority in a 32 bit integer.
+    priority: int = Field(0, ge=-(2**31), le=2**31 - 1)
+    submitter: str | None = None
 
 
 class TaskState(BaseModel):
     name: str
     state: str  # TODO: Make this one of the Enum values.
+    # The token /tasks/claim handed out with the task, needed to set a claimed task to TAKEN, RUNNING or COMPLETED.
+    lease_token: str | None = None
+
+
+def encode_cursor(job: Job, order_by: str) -> str:
+    """Encode the position of a job in the job list as an opaque cursor."""
+    key = [order_by, getattr(job, order_by), job.job_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, order_by: str) -> tuple[float, str]:
+    """Decode a cursor created by encode_cursor into a (value, job_id) sort key."""
+    try:
+        cursor_order_by, value, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as error:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from error
+    if cursor_order_by != order_by:
+        raise HTTPException(status_code=400, detail="The cursor is for a different order_by")
+    if isinstance(value, bool) or not isinstance(value, int | float) or not isinstance(job_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return (value, job_id)
 
 
 @router.get("/jobs", tags=["Jobs"])
 async def read_jobs(
+    *,
     manager: Annotated[JobManager, Depends(get_job_manager)],
     state_in: Annotated[list[JobState] | None, Query()] = None,
     state_not_in: Annotated[list[JobState] | None, Query()] = None,
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    cursor: Annotated[str | None, Query()] = None,
+    order_by: Annotated[OrderByField, Query()] = "created_at",
+    fields: Annotated[list[str] | None, Query()] = None,
 ):
-    """ """
+    """List the jobs.
+
+    The jobs are ordered by `order_by`. When `limit` is given only one page of jobs is returned and
+    `meta.next_cursor` is the `cursor` to pass to get the next page, it is null on the last page.
+    `fields` selects the job attributes to return.
+    """
+    after = None if cursor is None else decode_cursor(cursor, order_by)
+    # Get one more job than asked for to know if there is a next page.
+    page_limit = None if limit is None else limit + 1
+    jobs = manager.list_jobs_page(
+        states_in=state_in, states_not_in=state_not_in, order_by=order_by, after=after, limit=page_limit
+    )
     reply = {"data": []}
-    for job in manager.list_jobs(states_in=state_in, states_not_in=state_not_in):
-        reply["data"].append(job.dump(short=True))
+    for job in jobs[:limit]:
+        reply["data"].append(job.dump(short=True, fields=fields))
+    if limit is not None:
+        next_cursor = encode_cursor(jobs[limit - 1], order_by) if len(jobs) > limit else None
+        reply["meta"] = {"next_cursor": next_cursor}
     return reply
 
 
 @router.post("/jobs", tags=["Jobs"])
 async def create_job(spec: PartSpec, manager: Annotated[JobManager, Depends(get_job_manager)]):
-    """ """
-    job = manager.job_from_spec(spec.model_dump())
+    """Create a Job for a Part Specification, or return the existing Job for the same specification.
+
+    Tasks of Jobs with a higher `priority` are handed out first, tasks of Jobs with the same priority are shared
+    fairly between the `submitter`s, the part name is used when there is no submitter.
+    """
+    job = manager.job_from_spec(
+        spec.model_dump(exclude={"priority", "submitter"}), priority=spec.priority, submitter=spec.submitter
+    )
     return {"data": job.dump(short=True)}
 
 
+@router.post("/jobs:batch", tags=["Jobs"])
+async def create_jobs(specs: list[PartSpec], manager: Annotated[JobManager, Depends(get_job_manager)]):
+    """Create the Jobs for many Part Specifications in one request.
+
+    The Jobs are returned in the order of the specifications, `meta.deduplicated` is true when the Job existed
+    already, it was submitted before or earlier in the same batch.
+    """
+    data = []
+    with manager.batch_writes():
+        for spec in specs:
+            job, existing = manager.submit_spec(
+                spec.model_dump(exclude={"priority", "submitter"}), priority=spec.priority, submitter=spec.submitter
+            )
+            job_data = job.dump(short=True, fields=["state", "part_name"])
+            job_data["meta"] = {"deduplicated": existing}
+            data.append(job_data)
+    return {"data": data}
+
+
 @router.get("/jobs/{job_id}", tags=["Jobs"])
 async def read_job(job_id: str, manager: Annotated[JobManager, Depends(get_job_manager)]):
     """ """
@@ -89,13 +187,33 @@ async def job_get_task_state(job_id: str, task_id: str, manager: Annotated[JobMa
     return {"data": {"id": task_id, "attributes": {"state": state}}}
 
 
+@router.get("/jobs/{job_id}/timeline", tags=["Jobs"])
+async def job_timeline(job_id: str, manager: Annotated[JobManager, Depends(get_job_manager)]):
+    """The task state changes of a Job in the order they happened, with how long each task waited and ran.
+
+    Every event is the last time a task entered a state, a task that was reset only shows its latest run.
+    """
+    job = manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    events = [{**event, "at": datetime.fromtimestamp(event["at"], tz=UTC).isoformat()} for event in job.get_timeline()]
+    durations = {}
+    for task_name in job.get_tasks():
+        wait, run = task_durations(job.get_task_times(task_name))
+        durations[task_name] = {"wait_seconds": wait, "run_seconds": run}
+    return {"data": {"id": job_id, "type": "timeline", "attributes": {"events": events, "durations": durations}}}
+
+
 @router.post("/jobs/{job_id}/tasks", tags=["Jobs"])
 async def task_set_job_state(job_id: str, task: TaskState, manager: Annotated[JobManager, Depends(get_job_manager)]):
     """ """
     job = manager.get_job(job_id)
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    job.set_task_state(task.name, task.state)
+    try:
+        manager.update_task_state(job, task.name, task.state, task.lease_token)
+    except (StateConflictError, LeaseTokenError) as error:
+        raise HTTPException(status_code=409, detail=str(error)) from error
     return {}
 
 
@@ -105,8 +223,14 @@ async def task_spec(job_id: str, manager: Annotated[JobManager, Depends(get_job_
     job = manager.get_job(job_id)
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    spec = job.get_spec()
-    return {"data": spec}
+    # The spec is sent as it is stored, it does not need to be parsed and serialized again.
+    content = b'{"data": ' + job.get_spec_json() + b"}"
+    return Response(content=content, media_type="application/json")
+
+
+def dump_artifact(name: str, info: dict) -> dict:
+    """Dump the artifact information to a dictionary."""
+    return {"id": name, "type": "artifact", "attributes": {"size": info["size"], "sha256": info["sha256"]}}
 
 
 @router.get("/jobs/{job_id}/artifacts", tags=["Jobs"])
@@ -117,7 +241,7 @@ async def task_list_artifacts(job_id: str, manager: Annotated[JobManager, Depend
         raise HTTPException(status_code=404, detail="Job not found")
     artifacts = []
     for artifact in job.list_artifacts():
-        artifacts.append({"id": artifact, "type": "artifact"})
+        artifacts.append(dump_artifact(artifact, job.get_artifact_info(artifact)))
     return {"data": artifacts}
 
 
@@ -128,25 +252,111 @@ async def task_upload_artifacts(
     filename: Annotated[str, Form()],
     manager: Annotated[JobManager, Depends(get_job_manager)],
 ):
-    """ """
+    """Upload an artifact.
+
+    The upload is copied to disk in a worker thread, other requests are served while large artifacts are saved.
+    """
     job = manager.get_job(job_id)
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    logging.error(upload_file)
-    logging.error(filename)
-    destination = job.artifact_filepath(filename)
-    shutil.copyfileobj(upload_file.file, destination.open("wb"))
-    logging.info("Saved to %s", destination)
-    return {}
+    try:
+        info = await run_in_threadpool(job.save_artifact, filename, upload_file.file)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    finally:
+        await upload_file.close()
+    logging.info("Saved %s (%s bytes) to %s", filename, info["size"], info["path"])
+    return {"data": dump_artifact(filename, info)}
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check if an ETag is in the list of ETags of an If-None-Match header."""
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
 
 
 @router.get("/jobs/{job_id}/artifacts/{artifact_name}", tags=["Jobs"])
 async def task_download_artifacts(
-    job_id: str, artifact_name: str, manager: Annotated[JobManager, Depends(get_job_manager)]
+    job_id: str,
+    artifact_name: str,
+    manager: Annotated[JobManager, Depends(get_job_manager)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    if_modified_since: Annotated[str | None, Header()] = None,
 ):
-    """ """
+    """Download an artifact.
+
+    The ETag of an artifact is its SHA-256 hash. Conditional requests with If-None-Match or If-Modified-Since get a
+    304 Not Modified when the client has the current artifact, Range requests download part of the artifact.
+    """
+    job = manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if artifact_name not in job.list_artifacts():
+        # The artifact may have been uploaded through another process sharing the store.
+        manager.sync()
+    if artifact_name not in job.list_artifacts():
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    info = await run_in_threadpool(job.hash_artifact, artifact_name)
+    etag = f'"{info["sha256"]}"'
+    last_modified = formatdate(info["mtime"], usegmt=True)
+    headers = {"etag": etag, "last-modified": last_modified}
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and since.timestamp() >= int(info["mtime"]):
+            return Response(status_code=304, headers=headers)
+    return ArtifactResponse(info["path"], filename=artifact_name, headers=headers)
+
+
+def archive_response(job: Job, compression: str) -> StreamingResponse:
+    """Stream a zip archive of all the artifacts of a Job."""
+    files = [(name, job.get_artifact_path(name)) for name in job.list_artifacts()]
+    filename = f"{job.part_name or job.job_id}.zip"
+
+    def counted_chunks():
+        for chunk in stream_zip(files, compression=ZIP_COMPRESSION[compression]):
+            metrics.artifact_bytes_sent.inc(len(chunk))
+            yield chunk
+
+    return StreamingResponse(
+        counted_chunks(),
+        media_type="application/zip",
+        headers={"content-disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/jobs/{job_id}/archive", tags=["Jobs"])
+async def download_job_archive(
+    job_id: str,
+    manager: Annotated[JobManager, Depends(get_job_manager)],
+    compression: Annotated[Literal["stored", "deflated"], Query()] = "stored",
+):
+    """Download all the artifacts of a Job as a zip archive.
+
+    The archive is generated while it is sent, it is never stored.
+    """
     job = manager.get_job(job_id)
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    apath = job.get_artifact_path(artifact_name)
-    return FileResponse(apath, filename=artifact_name)
+    return archive_response(job, compression)
+
+
+@router.get("/parts/{part_name}/archive", tags=["Parts"])
+async def download_part_archive(
+    part_name: str,
+    manager: Annotated[JobManager, Depends(get_job_manager)],
+    compression: Annotated[Literal["stored", "deflated"], Query()] = "stored",
+):
+    """Download all the artifacts of the latest Job for a part as a zip archive."""
+    latest = manager.get_part(part_name).get(".")
+    job = None if latest is None else manager.get_job(latest["job_id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Part not found")
+    return archive_response(job, compression)
@@ -0,0 +1,140 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from datetime import UTC, datetime
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+
+from cycax_server.dependencies import JobManager, Settings, get_job_manager, get_settings
+from cycax_server.internal.job_manager import (
+    ACTIVE_TASK_STATES,
+    Job,
+    LeaseTokenError,
+    StateConflictError,
+    TaskState,
+)
+
+router = APIRouter()
+
+
+class TaskUpdate(BaseModel):
+    job_id: str
+    name: str
+    # Without a state the update is a heartbeat, it only extends the lease on the task.
+    state: TaskState | None = None
+    # The token /tasks/claim handed out with the task, needed for heartbeats and to set it to TAKEN, RUNNING or
+    # COMPLETED.
+    lease_token: str | None = None
+
+
+def dump_task(job: Job, task_name: str) -> dict:
+    """Dump the task information to a dictionary."""
+    lease = job.get_lease(task_name)
+    return {
+        "id": task_name,
+        "type": "task",
+        "attributes": {
+            "state": job.get_tasks()[task_name],
+            "job_id": job.job_id,
+            "part_name": job.part_name,
+            "lease_expires_at": None if lease is None else datetime.fromtimestamp(lease, tz=UTC).isoformat(),
+        },
+    }
+
+
+@router.post("/tasks/claim", tags=["Tasks"])
+async def claim_task(
+    task: Annotated[str, Query()],
+    manager: Annotated[JobManager, Depends(get_job_manager)],
+    settings: Annotated[Settings, Depends(get_settings)],
+    wait: Annotated[float, Query(ge=0)] = 0,
+):
+    """Claim the oldest CREATED task of a type.
+
+    The task is set to TAKEN and leased to the worker, if the task is not completed before the lease expires it is
+    handed out again. The `lease_token` attribute is only returned here, the worker sends it with its heartbeats and
+    state updates for the task. With `wait` the request is held open (long-poll) until a task becomes available or
+    `wait` seconds have passed. Returns `{"data": null}` when there is nothing to do.
+    """
+    wait = min(wait, settings.task_claim_max_wait)
+    job = await manager.wait_claim_task(task, lease_seconds=settings.task_lease_seconds, wait=wait)
+    if job is None:
+        return {"data": None}
+    data = dump_task(job, task.lower())
+    data["attributes"]["lease_token"] = job.get_lease_token(task)
+    return {"data": data}
+
+
+@router.get("/tasks/stats", tags=["Tasks"])
+async def task_stats(
+    manager: Annotated[JobManager, Depends(get_job_manager)],
+    task: Annotated[str | None, Query()] = None,
+):
+    """The p50, p95 and p99 of how long the tasks of each type waited in the queue and how long the workers took.
+
+    The statistics are over the most recent tasks of each type, see the `task_stats_window` setting. With `task`
+    only the statistics of that task type are returned.
+    """
+    task_names = manager.task_stats.task_names() if task is None else [task.lower()]
+    data = [
+        {"id": task_name, "type": "task_stats", "attributes": manager.task_stats.summary(task_name)}
+        for task_name in task_names
+    ]
+    return {"data": data}
+
+
+@router.post("/tasks:batch", tags=["Tasks"])
+async def update_tasks(
+    updates: list[TaskUpdate],
+    manager: Annotated[JobManager, Depends(get_job_manager)],
+    settings: Annotated[Settings, Depends(get_settings)],
+):
+    """Apply many task state updates and heartbeats in one request.
+
+    The states are written to the store in a single flush. A TAKEN or RUNNING task gets a fresh lease, an update
+    without a state is a heartbeat that only extends the lease. Heartbeats and updates to TAKEN, RUNNING or COMPLETED
+    need the `lease_token` of a claimed task. The tasks are returned in the order of the updates, `errors` lists the
+    updates for Jobs or tasks that do not exist, with a pointer to the update. An update with the wrong lease token,
+    or one that another server process overruled by changing the Job at the same time, is listed with status 409.
+    """
+    data = []
+    errors = []
+    jobs = {}
+    with manager.batch_writes():
+        for index, update in enumerate(updates):
+            job = manager.get_job(update.job_id)
+            task_name = update.name.lower()
+            if job is None or (update.state is None and task_name not in job.get_tasks()):
+                data.append(None)
+                detail = "Job not found" if job is None else "Task not found"
+                errors.append({"status": "404", "detail": detail, "source": {"pointer": f"/{index}"}})
+                continue
+            try:
+                manager.update_task_state(job, task_name, update.state, update.lease_token)
+            except (StateConflictError, LeaseTokenError) as error:
+                data.append(None)
+                errors.append({"status": "409", "detail": str(error), "source": {"pointer": f"/{index}"}})
+                continue
+            if job.get_tasks()[task_name] in ACTIVE_TASK_STATES:
+                job.renew_lease(task_name, settings.task_lease_seconds)
+            data.append(dump_task(job, task_name))
+            jobs[index] = job
+    # The states are written at the end of the batch, only then is it known which were rejected.
+    rejected = {}
+    for job in {job.job_id: job for job in jobs.values()}.values():
+        try:
+            manager.check_written(job)
+        except StateConflictError as error:
+            rejected[job.job_id] = str(error)
+    for index, job in jobs.items():
+        if job.job_id in rejected:
+            data[index] = None
+            errors.append({"status": "409", "detail": rejected[job.job_id], "source": {"pointer": f"/{index}"}})
+    errors.sort(key=lambda error: int(error["source"]["pointer"][1:]))
+    reply = {"data": data}
+    if errors:
+        reply["errors"] = errors
+    return reply
@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the content addressed artifact store."""
+
+import hashlib
+import io
+import os
+import time
+
+from cycax_server.internal.artifact_store import ArtifactStore
+
+
+def test_artifacts_are_stored_once(tmp_path):
+    store = ArtifactStore(tmp_path / "blobs")
+    contents = b"solid cube" * 100
+    job1 = tmp_path / "job1"
+    job2 = tmp_path / "job2"
+    job1.mkdir()
+    job2.mkdir()
+    sha256, size = store.ingest(io.BytesIO(contents), job1 / "cube.stl")
+    assert sha256 == hashlib.sha256(contents).hexdigest()
+    assert size == len(contents)
+    store.ingest(io.BytesIO(contents), job2 / "cube.stl")
+
+    blob_path = store.blob_path(sha256)
+    assert blob_path.read_bytes() == contents
+    assert (job2 / "cube.stl").read_bytes() == contents
+    assert blob_path.stat().st_nlink == 3
+
+    # Still referenced by job2.
+    (job1 / "cube.stl").unlink()
+    store.release(sha256)
+    assert store.reclaim() == 0
+    assert blob_path.exists()
+
+    (job2 / "cube.stl").unlink()
+    store.release(sha256)
+    assert store.reclaim() == len(contents)
+    assert not blob_path.exists()
+
+
+def test_load_keeps_recent_uploads(tmp_path):
+    store = ArtifactStore(tmp_path / "blobs")
+    tmp_dir = tmp_path / "blobs" / "tmp"
+    tmp_dir.mkdir(parents=True)
+    abandoned = tmp_dir / "abandoned"
+    uploading = tmp_dir / "uploading"
+    abandoned.write_bytes(b"solid")
+    uploading.write_bytes(b"solid")
+    two_hours_ago = time.time() - 7200
+    os.utime(abandoned, (two_hours_ago, two_hours_ago))
+
+    # Another process sharing the var_dir may still be writing to the recent temporary file.
+    store.load()
+    assert not abandoned.exists()
+    assert uploading.exists()
@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the background tasks that prune and reset Jobs."""
+
+import asyncio
+import io
+import os
+import time
+from contextlib import suppress
+
+from cycax_server.internal.background import prune_old_jobs, prune_stuck_jobs, run_state_flusher
+from cycax_server.internal.job_manager import JobManager, JobState, TaskState
+from cycax_server.internal.settings import Settings
+
+
+def part_spec(size: int) -> dict:
+    return {"name": "background-part", "features": [{"name": "cube", "x_size": size}]}
+
+
+def test_prune_old_jobs(tmp_path):
+    manager = JobManager(Settings(var_dir=tmp_path, job_store="file"))
+    manager.update_from_disk()
+    old_job = manager.job_from_spec(part_spec(1))
+    assembly = manager.job_from_spec({"name": "background-assembly", "parts": [part_spec(3)]})
+    (waited_for_id,) = assembly.depends_on
+    manager.close()
+    # The Jobs were last updated two hours ago.
+    two_hours_ago = time.time() - 7200
+    for job_id in (old_job.job_id, waited_for_id):
+        os.utime(tmp_path / "jobs" / job_id, (two_hours_ago, two_hours_ago))
+
+    settings = Settings(var_dir=tmp_path, job_store="file", keep_age_hours=1)
+    manager = JobManager(settings)
+    manager.update_from_disk()
+    # It is not known when a new Job was last updated, its age is 0.
+    new_job = manager.job_from_spec(part_spec(2))
+    asyncio.run(prune_old_jobs(manager, settings))
+    assert manager.get_job(old_job.job_id) is None
+    assert manager.get_job(new_job.job_id) is new_job
+    # A part is kept while an assembly waits for it.
+    waited_for = manager.get_job(waited_for_id)
+    assert waited_for is not None
+    assert manager.take_due_jobs("expiry") == [waited_for]
+    # The new Job is only checked again when it could be old enough.
+    assert manager.take_due_jobs("expiry") == []
+    assert new_job in manager.take_due_jobs("expiry", now=time.time() + 3 * 3600)
+    manager.close()
+
+
+def test_prune_stuck_jobs(tmp_path):
+    settings = Settings(var_dir=tmp_path)
+    manager = JobManager(settings)
+    manager.update_from_disk()
+    completed, with_artifact, expired, leased = (manager.job_from_spec(part_spec(size)) for size in range(4))
+    completed.set_task_state("freecad", TaskState.COMPLETED)
+    with_artifact.save_artifact("model.stl", io.BytesIO(b"solid"))
+    with_artifact.set_task_state("freecad", TaskState.COMPLETED)
+    expired.lease_task("freecad", -1)
+    leased.lease_task("freecad", -1)
+    # A heartbeat after the Job was scheduled extends the lease.
+    leased.renew_lease("freecad", 60)
+
+    asyncio.run(prune_stuck_jobs(manager, settings))
+    assert completed.get_tasks() == {"freecad": TaskState.CREATED}
+    assert with_artifact.state == JobState.COMPLETED
+    assert expired.get_tasks() == {"freecad": TaskState.CREATED}
+    assert leased.get_tasks() == {"freecad": TaskState.TAKEN}
+    # Only the Jobs that are due are checked, the renewed lease is checked when it expires.
+    assert manager.take_due_jobs("completed") == []
+    assert manager.take_due_jobs("lease") == []
+    assert manager.take_due_jobs("lease", now=time.time() + 61) == [leased]
+
+    # A Job that is RUNNING for too long is only reset when no worker holds a lease on its tasks.
+    leased.state_changed_at -= 301
+    manager.schedule_state_checks(leased)
+    asyncio.run(prune_stuck_jobs(manager, settings))
+    assert leased.get_tasks() == {"freecad": TaskState.TAKEN}
+    assert manager.take_due_jobs("running", now=time.time() + 61) == [leased]
+    # The task was set to RUNNING without a lease.
+    expired.set_task_state("freecad", TaskState.RUNNING)
+    expired.state_changed_at -= 301
+    manager.schedule_state_checks(expired)
+    asyncio.run(prune_stuck_jobs(manager, settings))
+    assert expired.state == JobState.CREATED
+    assert leased.state == JobState.RUNNING
+    manager.close()
+
+
+def test_state_flusher_finishes_write(tmp_path):
+    settings = Settings(var_dir=tmp_path, job_store="file", state_flush_interval=0.01)
+    manager = JobManager(settings)
+    manager.update_from_disk()
+    manager.job_from_spec(part_spec(5))
+    written = []
+    write_states = manager.write_states
+
+    def slow_write_states(states):
+        time.sleep(0.1)
+        write_states(states)
+        written.append(states)
+
+    manager.write_states = slow_write_states
+
+    async def cancel_while_writing():
+        task = asyncio.create_task(run_state_flusher(manager, settings))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        # The write in progress finished before the flusher stopped, the shutdown flush comes after it.
+        assert len(written) == 1
+
+    asyncio.run(cancel_while_writing())
+    manager.close()
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test deriving the Job ID from a Part Specification."""
+
+from fastapi.testclient import TestClient
+
+from cycax_server.dependencies import get_job_manager
+from cycax_server.internal.job_id import job_id_from_spec, legacy_job_id
+from cycax_server.internal.job_manager import JobManager
+from cycax_server.internal.settings import Settings
+from cycax_server.main import app
+
+from . import utils
+
+client = TestClient(app)
+
+
+def test_job_id_is_canonical():
+    spec = {"name": "test-part1", "features": [{"name": "cube", "x_size": 1, "y_size": 2.5}]}
+    same_spec = {"features": [{"y_size": 2.5, "x_size": 1.0, "name": "cube"}], "name": "other-name", "parts": []}
+    other_spec = {"name": "test-part1", "features": [{"name": "cube", "x_size": 1.5, "y_size": 2.5}]}
+    assert job_id_from_spec(spec) == job_id_from_spec(same_spec)
+    assert job_id_from_spec(spec) != job_id_from_spec(other_spec)
+    assert len(job_id_from_spec(spec)) == 40
+
+
+def test_job_id_blake2b():
+    spec = {"name": "test-part1", "features": [{"name": "cube", "x_size": 1}]}
+    job_id = job_id_from_spec(spec, "blake2b")
+    assert job_id.startswith("b2-")
+    assert len(job_id) == 43
+    assert job_id != job_id_from_spec(spec, "sha1")
+
+
+def test_legacy_job_id_resolves():
+    spec = {"name": "test-part1", "features": [{"name": "cube", "x_size": 3}], "parts": None}
+    job_id = legacy_job_id(spec)
+    utils.remove_job(client, job_id)
+    utils.remove_job(client, job_id_from_spec(spec))
+    # A Job created before the IDs were canonical.
+    manager = get_job_manager()
+    job = manager.new_job(job_id)
+    job.save_spec(spec)
+    manager.add_job(job)
+
+    response = client.post("/jobs", json=spec)
+    assert response.status_code == 200
+    assert response.json()["data"]["id"] == job_id
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_sha1_job_id_resolves_with_blake2b(tmp_path):
+    spec = {"name": "test-part1", "features": [{"name": "cube", "x_size": 4}]}
+    manager = JobManager(Settings(var_dir=tmp_path))
+    manager.update_from_disk()
+    job = manager.job_from_spec(spec)
+    manager.close()
+
+    # After a switch to blake2b the Jobs created with the default sha1 scheme are still found.
+    manager = JobManager(Settings(var_dir=tmp_path, job_id_scheme="blake2b"))
+    manager.update_from_disk()
+    assert manager.job_from_spec(spec).job_id == job.job_id
+    assert manager.job_from_spec({**spec, "features": [{"name": "cube", "x_size": 5}]}).job_id.startswith("b2-")
+    manager.close()
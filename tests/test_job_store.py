@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the job storage backends."""
+
+import pytest
+
+from cycax_server.internal.job_store import FileJobStore, JobStore, SharedJobStore, SqliteJobStore
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def store(request, tmp_path):
+    jobs_path = tmp_path / "jobs"
+    if request.param == "file":
+        job_store = FileJobStore(jobs_path)
+    else:
+        job_store = SqliteJobStore(tmp_path / "jobs.sqlite", jobs_path)
+    yield job_store
+    job_store.close()
+
+
+def test_incomplete_store(tmp_path):
+    class IncompleteStore(JobStore):
+        def load_spec_json(self, job_id: str) -> bytes:
+            return job_id.encode()
+
+    # A backend that does not implement the whole interface can not be created.
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteStore()
+
+    class UnsharedStore(SharedJobStore, FileJobStore):
+        pass
+
+    # A store shared by several processes also implements the shared interface.
+    with pytest.raises(TypeError, match="abstract"):
+        UnsharedStore(tmp_path)
+
+
+def test_store_round_trip(store, tmp_path):
+    spec = {"name": "test-part1", "features": [{"name": "cube"}, {"name": "hole"}]}
+    store.save_spec("job1", spec)
+    assert store.load_spec("job1") == spec
+    assert store.load_state("job1").get("tasks", {}) == {}
+
+    state = {
+        "job": "RUNNING",
+        "state_changed_at": 1.5,
+        "tasks": {"freecad": "RUNNING", "blender": "WAITING"},
+        "depends_on": ["job3", "job2"],
+        "priority": 3,
+        "submitter": "test",
+        "task_times": {"freecad": {"CREATED": 1.5, "RUNNING": 2.5}, "blender": {"WAITING": 1.5}},
+        "leases": {"freecad": 3.5},
+    }
+    store.save_state("job1", state)
+    assert store.load_state("job1") == state
+
+    records = list(store.load_records())
+    assert len(records) == 1
+    record = records[0]
+    assert record["job_id"] == "job1"
+    assert record["part_name"] == "test-part1"
+    assert record["feature_count"] == 2
+    assert record["part_count"] == 0
+    assert record["state"] == state
+    assert record["artifacts"] == {}
+
+    # The manifest is only restored for artifacts that exist.
+    job_path = tmp_path / "jobs" / "job1"
+    job_path.mkdir(parents=True, exist_ok=True)
+    (job_path / "model.stl").write_text("solid")
+    artifacts = {"model.stl": {"size": 5, "sha256": "abc", "mtime": 1.5}}
+    store.save_artifacts("job1", artifacts)
+    assert store.load_record("job1")["artifacts"] == artifacts
+
+    store.delete("job1")
+    assert list(store.load_records()) == []
+
+
+def test_sqlite_imports_file_jobs(tmp_path):
+    jobs_path = tmp_path / "jobs"
+    file_store = FileJobStore(jobs_path)
+    file_store.save_spec("job1", {"name": "test-part1", "features": []})
+    file_store.save_state("job1", {"job": "COMPLETED", "tasks": {"freecad": "COMPLETED"}})
+
+    sqlite_store = SqliteJobStore(tmp_path / "jobs.sqlite", jobs_path)
+    records = list(sqlite_store.load_records())
+    assert [record["job_id"] for record in records] == ["job1"]
+    assert records[0]["state"]["job"] == "COMPLETED"
+    sqlite_store.close()
+
+
+def test_file_store_snapshot(tmp_path):
+    jobs_path = tmp_path / "jobs"
+    snapshot_path = tmp_path / "jobs.snapshot.json"
+    store = FileJobStore(jobs_path, snapshot_path=snapshot_path)
+    list(store.load_records())
+    for job_id in ("job1", "job2"):
+        store.save_spec(job_id, {"name": job_id, "features": []})
+        store.save_state(job_id, {"job": "COMPLETED", "tasks": {"freecad": "COMPLETED"}})
+    store.checkpoint()
+    assert snapshot_path.exists()
+    # The record kept for the snapshot is the one on disk.
+    assert store.read_snapshot()["job1"] == store.load_record("job1")
+
+    # Change job2 after the snapshot was written.
+    (jobs_path / "job2" / "model.stl").write_text("solid")
+
+    loaded = []
+    store = FileJobStore(jobs_path, snapshot_path=snapshot_path)
+    load_record = store.load_record
+
+    def counting_load_record(job_id):
+        loaded.append(job_id)
+        return load_record(job_id)
+
+    store.load_record = counting_load_record
+    records = {record["job_id"]: record for record in store.load_records()}
+    assert sorted(records) == ["job1", "job2"]
+    assert loaded == ["job2"], "Only the Job that changed is read from disk."
+    assert records["job1"]["state"]["job"] == "COMPLETED"
+    assert list(records["job2"]["artifacts"]) == ["model.stl"]
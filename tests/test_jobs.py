@@ -2,9 +2,12 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import base64
+import json
+
 from fastapi.testclient import TestClient
 
-from cycax_server.dependencies import get_settings
+from cycax_server.dependencies import get_job_manager, get_settings
 from cycax_server.main import app
 
 from . import utils
@@ -26,7 +29,7 @@ def test_list_jobs():
 
 
 def test_post_job():
-    job_id = "cb891ab1ca8a68ce8610f0a1085e53fd2d4741f2"
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
     utils.remove_job(client, job_id)
     # Create a new Post.
     data = {"name": "test-part1", "features": []}
@@ -63,6 +66,83 @@ def test_job_list():
     assert len(jobs) > 1
 
     job_ids = [job["id"] for job in jobs]
-    for check_id in ("ecbeb873a2d8611f300e2f8df877e8d77a9cd98c", "b2feb2b22c131b9d3e57ded026535b908e149495"):
+    for check_id in ("68357deb330a4fc1d1fded12ba9411b50f2c83c3", "c19f5a2cafeae83a83cd12b07dff6939d7fda95e"):
         assert check_id in job_ids
         client.delete(f"/jobs/{check_id}")
+
+
+def test_job_list_pages():
+    job_ids = []
+    for number in range(1, 4):
+        feature = {"name": "cube", "type": "add", "x_size": number, "y_size": number, "z_size": number}
+        data = {"name": f"test-page-part-{number}", "features": [feature]}
+        response = client.post("/jobs", json=data)
+        assert response.status_code == 200
+        job_ids.append(response.json()["data"]["id"])
+
+    seen_ids = []
+    params = {"limit": 2, "fields": ["part_name"]}
+    while True:
+        response = client.get("/jobs", params=params)
+        assert response.status_code == 200
+        reply = response.json()
+        assert len(reply["data"]) <= 2
+        for job in reply["data"]:
+            assert list(job["attributes"].keys()) == ["part_name"]
+            seen_ids.append(job["id"])
+        if reply["meta"]["next_cursor"] is None:
+            break
+        params["cursor"] = reply["meta"]["next_cursor"]
+    assert len(seen_ids) == len(set(seen_ids))
+    for job_id in job_ids:
+        assert job_id in seen_ids
+        client.delete(f"/jobs/{job_id}")
+
+    response = client.get("/jobs", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    cursor = base64.urlsafe_b64encode(json.dumps(["created_at", "abc", "id"]).encode()).decode()
+    response = client.get("/jobs", params={"cursor": cursor})
+    assert response.status_code == 400
+    response = client.get("/jobs", params={"order_by": "xcreated_at_y"})
+    assert response.status_code == 422
+
+
+def test_job_spec():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+    spec_cache = get_job_manager().spec_cache
+    hits = spec_cache.hits
+    for _ in range(2):
+        response = client.get(f"/jobs/{job_id}/spec")
+        assert response.status_code == 200
+        assert response.json()["data"] == {"name": "test-part1", "features": [], "parts": None}
+    assert spec_cache.hits > hits
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_create_jobs_batch():
+    specs = [
+        {"name": "batch-part1", "features": [{"name": "cube", "x_size": 41}]},
+        {"name": "batch-part2", "features": [{"name": "cube", "x_size": 42}]},
+        {"name": "batch-part1", "features": [{"name": "cube", "x_size": 41}]},
+    ]
+    response = client.post("/jobs", json=specs[1])
+    assert response.status_code == 200
+    existing_id = response.json()["data"]["id"]
+
+    response = client.post("/jobs:batch", json=specs)
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [job["meta"]["deduplicated"] for job in data] == [False, True, True]
+    assert data[1]["id"] == existing_id
+    assert data[0]["id"] == data[2]["id"]
+    assert data[0]["attributes"]["part_name"] == "batch-part1"
+    response = client.get(f"/jobs/{data[0]['id']}/spec")
+    assert response.json()["data"]["features"] == specs[0]["features"]
+    # Cleanup
+    for job in data[:2]:
+        utils.remove_job(client, job["id"])
@@ -4,10 +4,14 @@
 
 """Tests the upload, list and download of a Jobs artifacts."""
 
+import hashlib
+import io
 import tempfile
+import zipfile
 
 from fastapi.testclient import TestClient
 
+from cycax_server.dependencies import get_job_manager
 from cycax_server.main import app
 
 from . import utils
@@ -39,7 +43,7 @@ def file_upload(client: TestClient, job_id: str, filename: str, contents: str):
 
 def test_post_job():
     # Remove an check
-    job_id = "cb891ab1ca8a68ce8610f0a1085e53fd2d4741f2"
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
     utils.remove_job(client, job_id)
     # Create a new Post.
     data = {"name": "test-part1", "features": []}
@@ -51,3 +55,101 @@ def test_post_job():
     file_download(client, job_id, filename, contents)
     # Cleanup
     utils.remove_job(client, job_id)
+
+
+def test_upload_info():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+    contents = b"1234567890" * 1000
+    response = client.post(
+        f"/jobs/{job_id}/artifacts", files={"upload_file": ("model.stl", contents)}, data={"filename": "model.stl"}
+    )
+    assert response.status_code == 200
+    attributes = response.json()["data"]["attributes"]
+    assert attributes["size"] == len(contents)
+    assert attributes["sha256"] == hashlib.sha256(contents).hexdigest()
+
+    for filename in ("../model.stl", "part.json", ".hidden"):
+        response = client.post(
+            f"/jobs/{job_id}/artifacts", files={"upload_file": ("model.stl", contents)}, data={"filename": filename}
+        )
+        assert response.status_code == 400
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_download_conditional_and_range():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+    contents = "1234567890-1234567890"
+    file_upload(client, job_id, "image.dat", contents)
+
+    response = client.get(f"/jobs/{job_id}/artifacts/image.dat")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(contents.encode()).hexdigest()}"'
+    assert response.headers["last-modified"]
+
+    response = client.get(f"/jobs/{job_id}/artifacts/image.dat", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = client.get(f"/jobs/{job_id}/artifacts/image.dat", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+    response = client.get(f"/jobs/{job_id}/artifacts/image.dat", headers={"Range": "bytes=11-"})
+    assert response.status_code == 206
+    assert response.content == contents[11:].encode()
+
+    response = client.get(f"/jobs/{job_id}/artifacts/missing.dat")
+    assert response.status_code == 404
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_artifacts_survive_restart():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+    contents = "1234567890-1234567890"
+    file_upload(client, job_id, "image.dat", contents)
+    # Reload the registry from disk, as at startup.
+    get_job_manager().flush_states()
+    get_job_manager().update_from_disk()
+
+    response = client.get(f"/jobs/{job_id}/artifacts")
+    artifacts = response.json()["data"]
+    assert [artifact["id"] for artifact in artifacts] == ["image.dat"]
+    assert artifacts[0]["attributes"]["sha256"] == hashlib.sha256(contents.encode()).hexdigest()
+    file_download(client, job_id, "image.dat", contents)
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_download_archive():
+    data = {"name": "archive-part", "features": [{"name": "cube", "x_size": 61}]}
+    response = client.post("/jobs", json=data)
+    job_id = response.json()["data"]["id"]
+    artifacts = {"model.stl": "solid archive-part\n" * 1000, "image.png": "not really a png"}
+    for filename, contents in artifacts.items():
+        file_upload(client, job_id, filename, contents)
+
+    for url in (f"/jobs/{job_id}/archive", "/parts/archive-part/archive?compression=deflated"):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        assert 'filename="archive-part.zip"' in response.headers["content-disposition"]
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            assert archive.testzip() is None
+            assert {name: archive.read(name).decode() for name in archive.namelist()} == artifacts
+
+    response = client.get("/parts/no-such-part/archive")
+    assert response.status_code == 404
+    # Cleanup
+    utils.remove_job(client, job_id)
@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test splitting assemblies into Jobs for their parts."""
+
+from fastapi.testclient import TestClient
+
+from cycax_server.main import app
+
+from . import utils
+
+client = TestClient(app)
+
+
+def create_job(spec: dict) -> str:
+    response = client.post("/jobs", json=spec)
+    assert response.status_code == 200
+    return response.json()["data"]["id"]
+
+
+def get_job_attributes(job_id: str) -> dict:
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    return response.json()["data"]["attributes"]
+
+
+def test_assembly_waits_for_parts():
+    part_a = {"name": "assembly-part-a", "features": [{"name": "cube", "x_size": 11}]}
+    part_b = {"name": "assembly-part-b", "features": [{"name": "cube", "x_size": 12}]}
+    assembly = {
+        "name": "assembly",
+        "parts": [
+            {**part_a, "position": [0, 0, 0]},
+            {**part_b, "position": [20, 0, 0]},
+            {**part_a, "position": [40, 0, 0]},
+        ],
+    }
+    # Part A was rendered before, the assembly reuses its Job.
+    part_a_id = create_job(part_a)
+    response = client.post(f"/jobs/{part_a_id}/tasks", json={"state": "COMPLETED", "name": "freecad"})
+    assert response.status_code == 200
+
+    assembly_id = create_job(assembly)
+    attributes = get_job_attributes(assembly_id)
+    assert len(attributes["depends_on"]) == 2
+    assert attributes["depends_on"][0] == part_a_id
+    part_b_id = attributes["depends_on"][1]
+    assert attributes["state"]["job"] == "CREATED"
+    assert attributes["state"]["tasks"] == {"blender": "WAITING"}
+    assert get_job_attributes(part_b_id)["state"]["tasks"] == {"freecad": "CREATED"}
+
+    # The assembly can not be claimed before its parts are completed.
+    response = client.post("/tasks/claim", params={"task": "blender"})
+    assert response.json()["data"] is None
+
+    response = client.post(f"/jobs/{part_b_id}/tasks", json={"state": "COMPLETED", "name": "freecad"})
+    assert response.status_code == 200
+    assert get_job_attributes(assembly_id)["state"]["tasks"] == {"blender": "CREATED"}
+    response = client.post("/tasks/claim", params={"task": "blender"})
+    assert response.json()["data"]["attributes"]["job_id"] == assembly_id
+    # Cleanup
+    for job_id in (assembly_id, part_a_id, part_b_id):
+        utils.remove_job(client, job_id)
+
+
+def test_deleted_part_is_recreated():
+    part = {"name": "assembly-part-c", "features": [{"name": "cube", "x_size": 13}]}
+    assembly = {"name": "assembly-c", "parts": [{**part, "position": [0, 0, 0]}]}
+    assembly_id = create_job(assembly)
+    (part_id,) = get_job_attributes(assembly_id)["depends_on"]
+
+    # The assembly waits for the part, deleting the part submits it again.
+    response = client.delete(f"/jobs/{part_id}")
+    assert response.status_code == 200
+    assert get_job_attributes(part_id)["state"]["tasks"] == {"freecad": "CREATED"}
+    response = client.post(f"/jobs/{part_id}/tasks", json={"state": "COMPLETED", "name": "freecad"})
+    assert response.status_code == 200
+    assert get_job_attributes(assembly_id)["state"]["tasks"] == {"blender": "CREATED"}
+    # Cleanup
+    for job_id in (assembly_id, part_id):
+        utils.remove_job(client, job_id)
+
+
+def test_completed_assembly_keeps_pruned_parts():
+    part = {"name": "assembly-part-d", "features": [{"name": "cube", "x_size": 14}]}
+    assembly = {"name": "assembly-d", "parts": [{**part, "position": [0, 0, 0]}]}
+    assembly_id = create_job(assembly)
+    (part_id,) = get_job_attributes(assembly_id)["depends_on"]
+    for job_id, task_name in ((part_id, "freecad"), (assembly_id, "blender")):
+        response = client.post(f"/jobs/{job_id}/tasks", json={"state": "COMPLETED", "name": task_name})
+        assert response.status_code == 200
+
+    # The part is no longer needed once the assembly is completed, submitting the assembly again does not render it.
+    utils.remove_job(client, part_id)
+    assert create_job(assembly) == assembly_id
+    response = client.get(f"/jobs/{part_id}")
+    assert response.status_code == 404
+    # Cleanup
+    utils.remove_job(client, assembly_id)
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the task pipelines and the task concurrency limits."""
+
+import pytest
+
+from cycax_server.internal.job_manager import JobManager, TaskState
+from cycax_server.internal.settings import Settings
+
+
+@pytest.fixture
+def manager(tmp_path):
+    settings = Settings(
+        var_dir=tmp_path,
+        task_pipelines={"part": [{"name": "pipecad"}, {"name": "pipeexport", "after": ["pipecad"]}]},
+        task_concurrency={"pipecad": 1},
+    )
+    manager = JobManager(settings)
+    manager.update_from_disk()
+    yield manager
+    manager.close()
+
+
+def test_pipeline_task_order(manager):
+    jobs = []
+    for size in (31, 32):
+        jobs.append(manager.job_from_spec({"name": "pipeline-part", "features": [{"name": "cube", "x_size": size}]}))
+    job1, job2 = jobs
+    assert job1.get_tasks() == {"pipecad": TaskState.CREATED, "pipeexport": TaskState.WAITING}
+
+    assert manager.claim_task("pipecad", lease_seconds=60) is job1
+    # Only one pipecad task may be handed out at a time.
+    assert manager.claim_task("pipecad", lease_seconds=60) is None
+    assert manager.claim_task("pipeexport", lease_seconds=60) is None
+
+    job1.set_task_state("pipecad", TaskState.COMPLETED)
+    assert job1.get_tasks()["pipeexport"] == TaskState.CREATED
+    assert manager.claim_task("pipecad", lease_seconds=60) is job2
+    assert manager.claim_task("pipeexport", lease_seconds=60) is job1
+
+    # A reset Job waits for its first task again.
+    job1.reset()
+    assert job1.get_tasks() == {"pipecad": TaskState.CREATED, "pipeexport": TaskState.WAITING}
+    # Cleanup
+    for job in jobs:
+        manager.delete_job(job.job_id)
+
+
+def test_pipeline_freecad_disabled(tmp_path):
+    manager = JobManager(Settings(var_dir=tmp_path, freecad_enabled=False))
+    assert manager.pipeline_tasks({"name": "part", "features": [{"name": "cube"}], "parts": [{"name": "p"}]}) == [
+        "blender"
+    ]
+
+
+def test_pipeline_after_is_validated(tmp_path):
+    with pytest.raises(ValueError, match="unknown tasks"):
+        Settings(var_dir=tmp_path, task_pipelines={"part": [{"name": "pipecad", "after": ["pipecadd"]}]})
+    with pytest.raises(ValueError, match="wait for each other"):
+        Settings(
+            var_dir=tmp_path,
+            task_pipelines={
+                "part": [{"name": "first"}, {"name": "a", "after": ["b"]}, {"name": "b", "after": ["a", "first"]}]
+            },
+        )
@@ -6,6 +6,7 @@
 
 from fastapi.testclient import TestClient
 
+from cycax_server.dependencies import get_job_manager
 from cycax_server.main import app
 
 from . import utils
@@ -29,7 +30,7 @@ def set_job_task(client: TestClient, job_id: str, taskname: str, state: str | No
 
 
 def test_state_update():
-    job_id = "ce5d2d744108a6221a7094d5fc2c6086f633afc1"
+    job_id = "7324c6c078140b6e1516a41f7d2db89000c27aeb"
     utils.remove_job(client, job_id)
     # Create a new Post.
     feature = {
@@ -55,3 +56,44 @@ def test_state_update():
     assert "sillycad" in task_names
     # Cleanup
     utils.remove_job(client, job_id)
+
+
+def list_job_ids(client: TestClient, state: str) -> list[str]:
+    response = client.get("/jobs", params={"state_in": state})
+    assert response.status_code == 200
+    return [job["id"] for job in response.json().get("data")]
+
+
+def test_state_filter():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+    assert job_id in list_job_ids(client, "CREATED")
+    assert job_id not in list_job_ids(client, "COMPLETED")
+
+    response = client.post(f"/jobs/{job_id}/tasks", json={"state": "COMPLETED", "name": "sillycad"})
+    assert response.status_code == 200
+    assert job_id not in list_job_ids(client, "CREATED")
+    assert job_id in list_job_ids(client, "COMPLETED")
+    # Cleanup
+    utils.remove_job(client, job_id)
+    assert job_id not in list_job_ids(client, "COMPLETED")
+
+
+def test_state_written_on_shutdown():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    with TestClient(app) as lifespan_client:
+        data = {"name": "test-part1", "features": []}
+        response = lifespan_client.post("/jobs", json=data)
+        assert response.status_code == 200
+        response = lifespan_client.post(f"/jobs/{job_id}/tasks", json={"state": "RUNNING", "name": "sillycad"})
+        assert response.status_code == 200
+    # The lifespan has ended, the write-behind must have written the state. Reload it as at startup.
+    get_job_manager().update_from_disk()
+    response = client.get(f"/jobs/{job_id}")
+    assert response.json()["data"]["attributes"]["state"] == {"job": "RUNNING", "tasks": {"sillycad": "RUNNING"}}
+    # Cleanup
+    utils.remove_job(client, job_id)
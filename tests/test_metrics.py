@@ -0,0 +1,47 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the job queue metrics."""
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from cycax_server.main import app
+
+from . import utils
+
+client = TestClient(app)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_job_metrics():
+    spec = {"name": "metrics-part", "features": [{"name": "cube", "x_size": 71}]}
+    created = sample("cycax_tasks", task="metricscad", state="CREATED")
+    dedup_hits = sample("cycax_job_dedup_hits_total")
+    response = client.post("/jobs", json=spec)
+    job_id = response.json()["data"]["id"]
+    response = client.post("/jobs", json=spec)
+    assert sample("cycax_job_dedup_hits_total") == dedup_hits + 1
+
+    client.post(f"/jobs/{job_id}/tasks", json={"state": "CREATED", "name": "metricscad"})
+    assert sample("cycax_tasks", task="metricscad", state="CREATED") == created + 1
+    waits = sample("cycax_task_wait_seconds_count", task="metricscad")
+    runs = sample("cycax_task_run_seconds_count", task="metricscad")
+    response = client.post("/tasks/claim", params={"task": "metricscad"})
+    lease_token = response.json()["data"]["attributes"]["lease_token"]
+    client.post(f"/jobs/{job_id}/tasks", json={"state": "COMPLETED", "name": "metricscad", "lease_token": lease_token})
+    assert sample("cycax_tasks", task="metricscad", state="CREATED") == created
+    assert sample("cycax_task_wait_seconds_count", task="metricscad") == waits + 1
+    assert sample("cycax_task_run_seconds_count", task="metricscad") == runs + 1
+    assert sample("cycax_task_state_transitions_total", task="metricscad", from_state="TAKEN", to_state="COMPLETED")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "cycax_jobs{" in response.text
+    # Cleanup
+    utils.remove_job(client, job_id)
+    assert sample("cycax_tasks", task="metricscad", state="COMPLETED") == 0
@@ -0,0 +1,63 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the order tasks are handed out and Jobs are checked in."""
+
+from types import SimpleNamespace
+
+from cycax_server.internal.scheduler import Deadlines, TaskQueue
+
+
+def make_job(job_id: str, submitter: str, priority: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(job_id=job_id, share_key=submitter, priority=priority)
+
+
+def take_all(queue: TaskQueue) -> list[str]:
+    order = []
+    while (job := queue.next()) is not None:
+        order.append(job.job_id)
+        queue.remove(job.job_id)
+    return order
+
+
+def test_task_queue_fair_share():
+    queue = TaskQueue()
+    for index in range(4):
+        queue.add(make_job(f"bulk{index}", "bulk"))
+    queue.add(make_job("user0", "user"))
+    queue.add(make_job("user1", "user"))
+    assert len(queue) == 6
+    # The submitters take turns, the bulk submitter does not hold up the user.
+    assert take_all(queue) == ["bulk0", "user0", "bulk1", "user1", "bulk2", "bulk3"]
+    assert len(queue) == 0
+
+
+def test_task_queue_priority():
+    queue = TaskQueue()
+    queue.add(make_job("low", "bulk"))
+    queue.add(make_job("high", "bulk", priority=10))
+    queue.add(make_job("normal", "user", priority=1))
+    queue.remove("missing")
+    assert "high" in queue
+    assert take_all(queue) == ["high", "normal", "low"]
+
+
+def test_deadlines():
+    deadlines = Deadlines()
+    deadlines.schedule("job1", 30)
+    deadlines.schedule("job2", 10)
+    deadlines.schedule("job3", 20)
+    # A later time does not replace an earlier one, an earlier time does.
+    deadlines.schedule("job2", 40)
+    deadlines.schedule("job1", 5)
+    deadlines.discard("job3")
+    assert len(deadlines) == 2
+    assert deadlines.take_due(4) == []
+    assert deadlines.take_due(25) == ["job1", "job2"]
+    assert len(deadlines) == 0
+    # The stale entries are skipped.
+    assert deadlines.take_due(100) == []
+    deadlines.schedule("job1", 50)
+    assert "job1" in deadlines
+    assert deadlines.take_due(100) == ["job1"]
@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test several server processes sharing one job store."""
+
+import asyncio
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from cycax_server.internal.background import prune_stuck_jobs
+from cycax_server.internal.job_manager import JobManager, JobState, LeaseTokenError, StateConflictError, TaskState
+from cycax_server.internal.settings import Settings
+
+
+def shared_manager(var_dir: Path, **settings) -> JobManager:
+    manager = JobManager(Settings(var_dir=var_dir, job_store="sqlite", shared_store=True, **settings))
+    manager.update_from_disk()
+    return manager
+
+
+def part_spec(size: int) -> dict:
+    return {"name": "shared-part", "features": [{"name": "cube", "x_size": size}]}
+
+
+def test_shared_settings_need_sqlite(tmp_path):
+    with pytest.raises(ValueError, match="sqlite"):
+        Settings(var_dir=tmp_path, job_store="file", shared_store=True)
+
+
+def test_shared_store_sync(tmp_path):
+    manager1 = shared_manager(tmp_path)
+    manager2 = shared_manager(tmp_path)
+    job = manager1.job_from_spec(part_spec(1))
+
+    # A Job created by the other process is found in the store.
+    job2 = manager2.get_job(job.job_id)
+    assert job2 is not job
+    assert job2.get_tasks() == {"freecad": TaskState.CREATED}
+    # The same spec gives the existing Job.
+    assert manager2.job_from_spec(part_spec(1)) is job2
+
+    # A task can only be taken once.
+    assert manager1.claim_task("freecad", lease_seconds=60) is job
+    assert manager2.claim_task("freecad", lease_seconds=60) is None
+    assert job2.get_tasks() == {"freecad": TaskState.TAKEN}
+
+    job.set_task_state("freecad", TaskState.COMPLETED)
+    manager2.sync()
+    assert job2.state == JobState.COMPLETED
+    assert manager2.list_jobs(states_in=[JobState.COMPLETED]) == [job2]
+
+    manager1.delete_job(job.job_id)
+    manager2.sync()
+    assert manager2.list_jobs() == []
+    manager1.close()
+    manager2.close()
+
+
+def test_shared_store_stale_release(tmp_path):
+    manager1, manager2, manager3 = (shared_manager(tmp_path) for _ in range(3))
+    assembly = manager1.job_from_spec({"name": "shared-assembly", "parts": [part_spec(1)]})
+    (part_id,) = assembly.depends_on
+    manager2.sync()
+    manager3.sync()
+
+    # The part completes and its assembly is handed out by the first process.
+    manager1.get_job(part_id).set_task_state("freecad", TaskState.COMPLETED)
+    assert manager1.claim_task("blender", lease_seconds=60) is assembly
+    # The second process releases the assembly from its out of date view, that must not undo the claim.
+    manager2.sync()
+    assert manager2.get_job(assembly.job_id).get_tasks() == {"blender": TaskState.TAKEN}
+    manager3.sync()
+    assert manager3.claim_task("blender", lease_seconds=60) is None
+    assert manager3.get_job(assembly.job_id).get_tasks() == {"blender": TaskState.TAKEN}
+    for manager in (manager1, manager2, manager3):
+        manager.close()
+
+
+def test_shared_store_leases(tmp_path):
+    manager1 = shared_manager(tmp_path)
+    manager2 = shared_manager(tmp_path)
+    job = manager1.job_from_spec(part_spec(2))
+    assert manager1.claim_task("freecad", lease_seconds=-1) is job
+
+    # A heartbeat sent to the other process renews the lease in the store.
+    job2 = manager2.get_job(job.job_id)
+    assert job2.get_lease("freecad") == job.get_lease("freecad")
+    job2.renew_lease("freecad", 60)
+    # The lease only expired in the first process, the task is not handed out again.
+    asyncio.run(prune_stuck_jobs(manager1))
+    assert job.get_tasks() == {"freecad": TaskState.TAKEN}
+    assert job.get_lease("freecad") == job2.get_lease("freecad")
+    assert manager1.claim_task("freecad", lease_seconds=60) is None
+
+    # A task completed through the other process is not reset when the lease expires here.
+    job.renew_lease("freecad", -1)
+    job2.set_task_state("freecad", TaskState.COMPLETED)
+    asyncio.run(prune_stuck_jobs(manager1))
+    assert job.get_tasks() == {"freecad": TaskState.COMPLETED}
+    manager1.close()
+    manager2.close()
+
+
+def test_shared_store_task_concurrency(tmp_path):
+    manager1, manager2 = (shared_manager(tmp_path, task_concurrency={"freecad": 1}) for _ in range(2))
+    job1 = manager1.job_from_spec(part_spec(3))
+    job2 = manager1.job_from_spec(part_spec(4))
+    manager2.sync()
+
+    assert manager1.claim_task("freecad", lease_seconds=60) is job1
+    # The other process has not seen the claim yet, the limit is checked in the store.
+    assert manager2.claim_task("freecad", lease_seconds=60) is None
+    job1.set_task_state("freecad", TaskState.COMPLETED)
+    manager2.sync()
+    assert manager2.claim_task("freecad", lease_seconds=60).job_id == job2.job_id
+    manager1.close()
+    manager2.close()
+
+
+def test_shared_store_worker_updates(tmp_path):
+    manager1 = shared_manager(tmp_path)
+    manager2 = shared_manager(tmp_path)
+    job = manager1.job_from_spec(part_spec(5))
+    job2 = manager2.get_job(job.job_id)
+    assert manager1.claim_task("freecad", lease_seconds=60) is job
+    lease_token = job.get_lease_token("freecad")
+    manager1.update_task_state(job, "freecad", TaskState.RUNNING, lease_token)
+
+    # The other process still sees the task as CREATED, the update from the worker applies to the stored state.
+    assert job2.get_tasks() == {"freecad": TaskState.CREATED}
+    with pytest.raises(LeaseTokenError):
+        manager2.update_task_state(job2, "freecad", TaskState.COMPLETED, "other")
+    manager2.update_task_state(job2, "freecad", TaskState.COMPLETED, lease_token)
+    manager1.sync()
+    assert job.get_tasks() == {"freecad": TaskState.COMPLETED}
+
+    # A change from an out of date view is rejected and reported.
+    job.set_task_state("freecad", TaskState.CREATED)
+    job2.set_task_state("freecad", TaskState.RUNNING)
+    with pytest.raises(StateConflictError):
+        manager2.check_written(job2)
+    assert job2.get_tasks() == {"freecad": TaskState.CREATED}
+    manager1.close()
+    manager2.close()
+
+
+def claim_all(var_dir: Path) -> list[str]:
+    """Claim tasks in a separate process until there are none left."""
+    manager = shared_manager(var_dir)
+    claimed = []
+    while (job := manager.claim_task("freecad", lease_seconds=60)) is not None:
+        claimed.append(job.job_id)
+    manager.close()
+    return claimed
+
+
+def test_shared_store_processes(tmp_path):
+    manager = shared_manager(tmp_path)
+    job_ids = {manager.job_from_spec(part_spec(size)).job_id for size in range(40)}
+    manager.close()
+
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        results = pool.map(claim_all, [tmp_path] * 4)
+    claimed = [job_id for result in results for job_id in result]
+    # Every task is handed out exactly once.
+    assert sorted(claimed) == sorted(job_ids)
@@ -0,0 +1,32 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test the size bounded spec cache."""
+
+from cycax_server.internal.spec_cache import SpecCache
+
+
+def test_spec_cache_evicts_least_recently_used():
+    cache = SpecCache(max_bytes=10)
+    cache.put("job1", b"1234")
+    cache.put("job2", b"1234")
+    assert cache.get("job1") == b"1234"
+    cache.put("job3", b"1234")
+    # job2 was used least recently.
+    assert cache.get("job2") is None
+    assert cache.get("job1") == b"1234"
+    assert cache.get("job3") == b"1234"
+    assert cache.size == 8
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_spec_cache_invalidate():
+    cache = SpecCache(max_bytes=10)
+    cache.put("job1", b"1234")
+    cache.invalidate("job1")
+    assert cache.get("job1") is None
+    assert cache.size == 0
+    # Too big to cache.
+    cache.put("job2", b"12345678901")
+    assert len(cache) == 0
@@ -0,0 +1,235 @@
+# SPDX-FileCopyrightText: 2025 Tsolo.io
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""Test workers claiming tasks."""
+
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from cycax_server.internal.job_manager import JobManager, TaskState
+from cycax_server.internal.settings import Settings
+from cycax_server.main import app
+
+from . import utils
+
+client = TestClient(app)
+
+
+def test_claim_task():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+    response = client.post(f"/jobs/{job_id}/tasks", json={"state": "CREATED", "name": "claimcad"})
+    assert response.status_code == 200
+
+    response = client.post("/tasks/claim", params={"task": "claimcad"})
+    assert response.status_code == 200
+    task = response.json().get("data")
+    assert task["id"] == "claimcad"
+    assert task["attributes"]["job_id"] == job_id
+    assert task["attributes"]["state"] == "TAKEN"
+    assert task["attributes"]["lease_expires_at"]
+
+    # The task is taken, a second worker gets nothing.
+    response = client.post("/tasks/claim", params={"task": "claimcad"})
+    assert response.status_code == 200
+    assert response.json().get("data") is None
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_claim_task_wait():
+    job_id = "871d01b18b7460aea3f8dc2dde57c872cf5c84e7"
+    utils.remove_job(client, job_id)
+    data = {"name": "test-part1", "features": []}
+    response = client.post("/jobs", json=data)
+    assert response.status_code == 200
+
+    # Nothing to claim, the request returns empty handed after the wait.
+    start = time.monotonic()
+    response = client.post("/tasks/claim", params={"task": "waitcad", "wait": 0.2})
+    assert response.status_code == 200
+    assert response.json().get("data") is None
+    assert time.monotonic() - start >= 0.2
+
+    # A waiting worker is woken as soon as the task is created.
+    replies = []
+
+    def claim():
+        replies.append(client.post("/tasks/claim", params={"task": "waitcad", "wait": 10}))
+
+    worker = threading.Thread(target=claim)
+    start = time.monotonic()
+    worker.start()
+    time.sleep(0.2)
+    response = client.post(f"/jobs/{job_id}/tasks", json={"state": "CREATED", "name": "waitcad"})
+    assert response.status_code == 200
+    worker.join()
+    assert time.monotonic() - start < 5
+    assert replies[0].json()["data"]["attributes"]["job_id"] == job_id
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_claim_task_priority():
+    specs = [
+        {"name": "bulk-part", "features": [{"name": "cube", "x_size": 21}], "submitter": "bulk"},
+        {"name": "bulk-part", "features": [{"name": "cube", "x_size": 22}], "submitter": "bulk"},
+        {"name": "user-part", "features": [{"name": "cube", "x_size": 23}], "submitter": "user"},
+        {"name": "urgent-part", "features": [{"name": "cube", "x_size": 24}], "priority": 5},
+    ]
+    job_ids = []
+    for spec in specs:
+        response = client.post("/jobs", json=spec)
+        assert response.status_code == 200
+        job_ids.append(response.json()["data"]["id"])
+        response = client.post(f"/jobs/{job_ids[-1]}/tasks", json={"state": "CREATED", "name": "prioritycad"})
+        assert response.status_code == 200
+    response = client.get(f"/jobs/{job_ids[3]}")
+    assert response.json()["data"]["attributes"]["priority"] == 5
+    # The priority has to fit the stores.
+    response = client.post("/jobs", json={**specs[3], "priority": 2**70})
+    assert response.status_code == 422
+    # The spec is saved without the scheduling fields.
+    response = client.get(f"/jobs/{job_ids[0]}/spec")
+    assert "submitter" not in response.json()["data"]
+
+    claimed = []
+    for _ in specs:
+        response = client.post("/tasks/claim", params={"task": "prioritycad"})
+        claimed.append(response.json()["data"]["attributes"]["job_id"])
+    assert claimed == [job_ids[3], job_ids[0], job_ids[2], job_ids[1]]
+    # Cleanup
+    for job_id in job_ids:
+        utils.remove_job(client, job_id)
+
+
+def test_update_tasks_batch():
+    job_ids = []
+    for size in (51, 52):
+        response = client.post(
+            "/jobs", json={"name": "batch-task-part", "features": [{"name": "cube", "x_size": size}]}
+        )
+        job_ids.append(response.json()["data"]["id"])
+        response = client.post(f"/jobs/{job_ids[-1]}/tasks", json={"state": "CREATED", "name": "batchcad"})
+    response = client.post("/tasks/claim", params={"task": "batchcad"})
+    lease_expires_at = response.json()["data"]["attributes"]["lease_expires_at"]
+    lease_token = response.json()["data"]["attributes"]["lease_token"]
+
+    time.sleep(0.01)
+    updates = [
+        {"job_id": job_ids[0], "name": "batchcad", "lease_token": lease_token},
+        {"job_id": job_ids[1], "name": "batchcad", "state": "RUNNING"},
+        {"job_id": "unknown", "name": "batchcad", "state": "RUNNING"},
+        {"job_id": job_ids[0], "name": "batchcad", "state": "COMPLETED", "lease_token": lease_token},
+    ]
+    response = client.post("/tasks:batch", json=updates)
+    assert response.status_code == 200
+    reply = response.json()
+    # The heartbeat extended the lease.
+    assert reply["data"][0]["attributes"]["lease_expires_at"] > lease_expires_at
+    assert reply["data"][1]["attributes"]["state"] == "RUNNING"
+    assert reply["data"][1]["attributes"]["lease_expires_at"]
+    assert reply["data"][2] is None
+    assert reply["errors"] == [{"status": "404", "detail": "Job not found", "source": {"pointer": "/2"}}]
+    assert reply["data"][3]["attributes"]["state"] == "COMPLETED"
+    assert reply["data"][3]["attributes"]["lease_expires_at"] is None
+    response = client.get(f"/jobs/{job_ids[0]}/tasks/batchcad")
+    assert response.json()["data"]["attributes"]["state"] == "COMPLETED"
+
+    response = client.post("/tasks:batch", json=[{"job_id": job_ids[0], "name": "batchcad", "state": "DONE"}])
+    assert response.status_code == 422
+    # Cleanup
+    for job_id in job_ids:
+        utils.remove_job(client, job_id)
+
+
+def test_lease_token():
+    response = client.post("/jobs", json={"name": "lease-token-part", "features": [{"name": "cube", "x_size": 62}]})
+    job_id = response.json()["data"]["id"]
+    client.post(f"/jobs/{job_id}/tasks", json={"state": "CREATED", "name": "tokencad"})
+    response = client.post("/tasks/claim", params={"task": "tokencad"})
+    lease_token = response.json()["data"]["attributes"]["lease_token"]
+    assert lease_token
+
+    # Only the worker holding the lease can update the task.
+    for token in (None, "other"):
+        update = {"state": "RUNNING", "name": "tokencad", "lease_token": token}
+        assert client.post(f"/jobs/{job_id}/tasks", json=update).status_code == 409
+    response = client.post("/tasks:batch", json=[{"job_id": job_id, "name": "tokencad", "lease_token": "other"}])
+    assert response.json()["data"] == [None]
+    assert response.json()["errors"][0]["status"] == "409"
+    update = {"state": "COMPLETED", "name": "tokencad", "lease_token": lease_token}
+    assert client.post(f"/jobs/{job_id}/tasks", json=update).status_code == 200
+    # The lease is gone with the task completed.
+    update = {"state": "RUNNING", "name": "tokencad", "lease_token": lease_token}
+    assert client.post(f"/jobs/{job_id}/tasks", json=update).status_code == 409
+    response = client.get(f"/jobs/{job_id}/tasks/tokencad")
+    assert response.json()["data"]["attributes"]["state"] == "COMPLETED"
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_task_timeline_and_stats():
+    response = client.post("/jobs", json={"name": "timeline-part", "features": [{"name": "cube", "x_size": 61}]})
+    job_id = response.json()["data"]["id"]
+    client.post(f"/jobs/{job_id}/tasks", json={"state": "CREATED", "name": "timelinecad"})
+    response = client.post("/tasks/claim", params={"task": "timelinecad"})
+    assert response.json()["data"]["attributes"]["job_id"] == job_id
+    lease_token = response.json()["data"]["attributes"]["lease_token"]
+    for state in ("RUNNING", "COMPLETED"):
+        update = {"state": state, "name": "timelinecad", "lease_token": lease_token}
+        assert client.post(f"/jobs/{job_id}/tasks", json=update).status_code == 200
+
+    response = client.get(f"/jobs/{job_id}/timeline")
+    assert response.status_code == 200
+    attributes = response.json()["data"]["attributes"]
+    events = [(event["task"], event["state"]) for event in attributes["events"] if event["task"] == "timelinecad"]
+    assert events == [
+        ("timelinecad", "CREATED"),
+        ("timelinecad", "TAKEN"),
+        ("timelinecad", "RUNNING"),
+        ("timelinecad", "COMPLETED"),
+    ]
+    assert attributes["durations"]["timelinecad"]["wait_seconds"] >= 0
+    assert attributes["durations"]["timelinecad"]["run_seconds"] >= 0
+    assert client.get("/jobs/unknown/timeline").status_code == 404
+
+    response = client.get("/tasks/stats", params={"task": "timelinecad"})
+    assert response.status_code == 200
+    [stats] = response.json()["data"]
+    assert stats["id"] == "timelinecad"
+    assert stats["attributes"]["wait_seconds"]["count"] >= 1
+    assert stats["attributes"]["run_seconds"]["p99"] >= stats["attributes"]["run_seconds"]["p50"]
+    response = client.get("/tasks/stats", params={"task": "unknown"})
+    assert response.json()["data"][0]["attributes"]["run_seconds"] == {
+        "count": 0,
+        "p50": None,
+        "p95": None,
+        "p99": None,
+    }
+    # Cleanup
+    utils.remove_job(client, job_id)
+
+
+def test_task_times_are_persisted(tmp_path):
+    manager = JobManager(Settings(var_dir=tmp_path, state_flush_interval=0))
+    manager.update_from_disk()
+    job = manager.job_from_spec({"name": "timeline-part", "features": [{"name": "cube", "x_size": 62}]})
+    assert manager.claim_task("freecad", lease_seconds=60) is job
+    job.set_task_state("freecad", TaskState.COMPLETED)
+    times = dict(job.get_task_times("freecad"))
+    manager.close()
+
+    # The times and the statistics survive a restart.
+    manager = JobManager(Settings(var_dir=tmp_path))
+    manager.update_from_disk()
+    assert manager.get_job(job.job_id).get_task_times("freecad") == times
+    assert manager.get_job(job.job_id).state_changed_at == job.state_changed_at
+    assert manager.task_stats.summary("freecad")["run_seconds"]["count"] == 1
+    manager.close()